@@ -1,6 +1,12 @@
 from dataclasses import dataclass, asdict
 from enum import Enum
-from typing import Tuple, List, Any
+from typing import Tuple, List, Any, Iterable, Iterator, overload
+
+import numpy as np
+
+DEFAULT_PORTFOLIO = "main"
+DEFAULT_ACCOUNT = "default"
+AGGREGATE_ACCOUNT = "*"
 
 
 class AssetType(Enum):
@@ -8,18 +14,46 @@ class AssetType(Enum):
     STOCK = "stock"
 
 
+class AlertKind(Enum):
+    PRICE = "price"
+    CHANGE_PCT = "change_pct"
+    PL_TOTAL = "pl_total"
+    PORTFOLIO_VALUE = "portfolio_value"
+
+
+class AlertDirection(Enum):
+    ABOVE = "above"
+    BELOW = "below"
+
+
+class Indicator(Enum):
+    SMA = "sma"
+    EMA = "ema"
+    RSI = "rsi"
+    BOLLINGER = "bollinger"
+    VOLATILITY = "volatility"
+
+
 class ChartPeriod(Enum):
+    DAY = "day"
+    WEEK = "week"
     MONTH = "month"
     HALF_YEAR = "half_year"
     YEAR = "year"
 
+    @property
+    def intraday(self) -> bool:
+        """Served from captured quote ticks instead of the daily history."""
+        return self in (ChartPeriod.DAY, ChartPeriod.WEEK)
+
 
-@dataclass
+@dataclass(slots=True)
 class Asset:
     asset_type: AssetType
     name: str
     amount: float
     avg_price: float
+    account: str = DEFAULT_ACCOUNT
 
     def to_json(self) -> dict:
         d = asdict(self)
@@ -37,10 +71,24 @@ class Asset:
             name=d["name"],
             amount=float(d["amount"]),
             avg_price=float(d["avg_price"]),
+            account=d.get("account", DEFAULT_ACCOUNT),
         )
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
+class Quote:
+    price: float
+    change_24h: float
+
+    @property
+    def change_pct(self) -> float:
+        base = self.price - self.change_24h
+        if not base:
+            return 0.0
+        return self.change_24h / base * 100
+
+
+@dataclass(slots=True, frozen=True)
 class AssetStat:
     asset: Asset
     price: float
@@ -48,10 +96,151 @@ class AssetStat:
     pl_today: float
     pl_total: float
 
+    def to_json(self) -> dict:
+        d = self.asset.to_json()
+        d["price"] = self.price
+        d["value"] = self.value
+        d["pl_today"] = self.pl_today
+        d["pl_total"] = self.pl_total
+        return d
+
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TotalStat:
     total_value: float
     pl_total: float
     pl_today: float
     asset_stats: List[AssetStat]
+    # Time of the oldest snapshot quote still in use, None when fully live
+    as_of_ms: int | None = None
+
+    def to_json(self) -> dict:
+        return {
+            "total_value": self.total_value,
+            "pl_total": self.pl_total,
+            "pl_today": self.pl_today,
+            "as_of_ms": self.as_of_ms,
+            "assets": [stat.to_json() for stat in self.asset_stats],
+        }
+
+
+@dataclass(slots=True)
+class AlertRule:
+    kind: AlertKind
+    target: str
+    direction: AlertDirection
+    threshold: float
+    id: int | None = None
+    # Set while the condition holds after firing, cleared once it no longer does
+    last_fired_ms: int | None = None
+
+    def is_triggered(self, value: float) -> bool:
+        if self.direction == AlertDirection.ABOVE:
+            return value >= self.threshold
+        return value <= self.threshold
+
+
+@dataclass(slots=True, frozen=True)
+class FiredAlert:
+    rule: AlertRule
+    value: float
+    ts_ms: int
+
+    def describe(self) -> str:
+        rule = self.rule
+        return (
+            f"{rule.target} {rule.kind.value} {self.value:.2f} "
+            f"is {rule.direction.value} {rule.threshold:g}"
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class RiskStat:
+    symbols: List[str]
+    volatility: List[float]
+    max_drawdown: List[float]
+    correlation: List[List[float]]
+    portfolio_volatility: float
+    portfolio_max_drawdown: float
+    beta: float | None
+    benchmark: str | None
+    as_of_ms: int
+
+
+@dataclass(slots=True, frozen=True)
+class SymbolFootprint:
+    symbol: str
+    rows: int
+    bytes: int
+    first_ts_ms: int | None
+    last_ts_ms: int | None
+    last_called_ms: int | None
+
+
+_ROW_DTYPE = np.dtype([("ts", np.int64), ("price", np.float64)])
+
+
+class PriceSeries:
+    """Price history as two contiguous arrays: int64 ms timestamps, float64 prices.
+
+    Points are kept sorted by timestamp. Slicing, by index or by time, returns
+    a view sharing the same buffers. Indexing and iterating still yield
+    (ts, price) tuples for code that treats a series as a list of rows.
+    """
+
+    __slots__ = ("ts", "prices")
+
+    def __init__(self, ts: np.ndarray, prices: np.ndarray):
+        self.ts = ts
+        self.prices = prices
+
+    @classmethod
+    def empty(cls) -> "PriceSeries":
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, float]]) -> "PriceSeries":
+        packed = np.fromiter(rows, dtype=_ROW_DTYPE)
+        return cls(
+            np.ascontiguousarray(packed["ts"]), np.ascontiguousarray(packed["price"])
+        )
+
+    def to_json(self) -> dict:
+        return {"ts": self.ts.tolist(), "prices": self.prices.tolist()}
+
+    def to_rows(self) -> Iterator[Tuple[int, float]]:
+        return zip(self.ts.tolist(), self.prices.tolist())
+
+    def between(self, start_ms: int, end_ms: int | None = None) -> "PriceSeries":
+        start = np.searchsorted(self.ts, start_ms, side="left")
+        end = len(self.ts)
+        if end_ms is not None:
+            end = np.searchsorted(self.ts, end_ms, side="right")
+        return PriceSeries(self.ts[start:end], self.prices[start:end])
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __iter__(self) -> Iterator[Tuple[int, float]]:
+        return self.to_rows()
+
+    @overload
+    def __getitem__(self, index: int) -> Tuple[int, float]: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "PriceSeries": ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PriceSeries(self.ts[index], self.prices[index])
+        return int(self.ts[index]), float(self.prices[index])
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PriceSeries):
+            return NotImplemented
+        return np.array_equal(self.ts, other.ts) and np.array_equal(
+            self.prices, other.prices
+        )
+
+    def __repr__(self) -> str:
+        return f"PriceSeries({len(self)} points)"
@@ -1,15 +1,44 @@
 import aiosqlite
-from typing import List, Tuple
+import json
+from itertools import groupby
+from typing import List, Tuple, Dict
 import time
 import logging
 from datetime import datetime, timezone, timedelta
-from data_types import ChartPeriod, Asset, AssetType
+from data_types import (
+    ChartPeriod,
+    Asset,
+    AssetType,
+    DEFAULT_PORTFOLIO,
+    DEFAULT_ACCOUNT,
+    AlertRule,
+    AlertKind,
+    AlertDirection,
+    SymbolFootprint,
+    PriceSeries,
+    TotalStat,
+)
 
 DB_PATH = "cache.db"
 
+WALLET_TABLE = """
+CREATE TABLE IF NOT EXISTS wallet (
+    id INTEGER PRIMARY KEY,
+    portfolio_id INTEGER NOT NULL,
+    account    TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    amount     REAL NOT NULL,
+    price      REAL NOT NULL,
+    asset_type TEXT NOT NULL,
+    UNIQUE (portfolio_id, account, name),
+    FOREIGN KEY (portfolio_id) REFERENCES portfolios(id) ON DELETE CASCADE
+)"""
+
 
 async def init_db():
     async with aiosqlite.connect(DB_PATH) as db:
+        # WAL lets chart reads run while retention deletes and vacuums
+        await db.execute("PRAGMA journal_mode=WAL")
         await db.execute(
             """
         CREATE TABLE IF NOT EXISTS assets (
@@ -28,19 +57,88 @@ async def init_db():
             FOREIGN KEY (asset_id) REFERENCES assets(id) ON DELETE CASCADE
         )"""
         )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS prices_asset_ts ON prices (asset_id, ts_ms)"
+        )
+        # Quote ticks captured by the refresh loop, backing 1D and 1W charts
         await db.execute(
             """
-        CREATE TABLE IF NOT EXISTS wallet (
+        CREATE TABLE IF NOT EXISTS intraday (
             id INTEGER PRIMARY KEY,
-            name TEXT UNIQUE NOT NULL,
-            amount     REAL NOT NULL,
+            asset_id  INTEGER NOT NULL,
+            ts_ms     INTEGER NOT NULL,
             price     REAL NOT NULL,
-            asset_type TEXT NOT NULL
+            FOREIGN KEY (asset_id) REFERENCES assets(id) ON DELETE CASCADE
+        )"""
+        )
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS intraday_asset_ts
+            ON intraday (asset_id, ts_ms)"""
+        )
+        await db.execute(
+            """
+        CREATE TABLE IF NOT EXISTS portfolios (
+            id   INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
+        )"""
+        )
+        await db.execute(
+            "INSERT OR IGNORE INTO portfolios (name) VALUES (?)", (DEFAULT_PORTFOLIO,)
+        )
+        await _migrate_legacy_wallet(db)
+        await db.execute(WALLET_TABLE)
+        await db.execute(
+            """
+        CREATE TABLE IF NOT EXISTS alerts (
+            id            INTEGER PRIMARY KEY,
+            kind          TEXT NOT NULL,
+            target        TEXT NOT NULL,
+            direction     TEXT NOT NULL,
+            threshold     REAL NOT NULL,
+            last_fired_ms INTEGER
         )"""
         )
+        await db.execute(
+            """
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id           INTEGER PRIMARY KEY,
+            portfolio_id INTEGER NOT NULL,
+            ts_ms        INTEGER NOT NULL,
+            total_value  REAL NOT NULL,
+            pl_total     REAL NOT NULL,
+            pl_today     REAL NOT NULL,
+            payload      TEXT NOT NULL,
+            FOREIGN KEY (portfolio_id) REFERENCES portfolios(id) ON DELETE CASCADE
+        )"""
+        )
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS snapshots_portfolio_ts
+            ON snapshots (portfolio_id, ts_ms)"""
+        )
         await db.commit()
 
 
+async def _migrate_legacy_wallet(db: aiosqlite.Connection):
+    # Older databases have a wallet table with a global UNIQUE on name and no
+    # portfolio/account columns. SQLite can't drop a constraint in place, so
+    # the table is rebuilt and every row lands in the default portfolio.
+    curr = await db.execute("PRAGMA table_info(wallet)")
+    columns = {row[1] for row in await curr.fetchall()}
+    if not columns or "portfolio_id" in columns:
+        return
+    logging.info("Migrating wallet table to portfolios/accounts schema")
+    portfolio_id = await _portfolio_id(db, DEFAULT_PORTFOLIO)
+    await db.execute("ALTER TABLE wallet RENAME TO wallet_legacy")
+    await db.execute(WALLET_TABLE)
+    await db.execute(
+        """
+    INSERT INTO wallet (portfolio_id, account, name, amount, price, asset_type)
+    SELECT ?, ?, name, amount, price, asset_type FROM wallet_legacy""",
+        (portfolio_id, DEFAULT_ACCOUNT),
+    )
+    await db.execute("DROP TABLE wallet_legacy")
+
+
 async def get_last_updated_price(asset: str):
     async with aiosqlite.connect(DB_PATH) as db:
         asset_id = await _asset_id(db, asset)
@@ -53,8 +151,12 @@ async def get_last_updated_price(asset: str):
         return None
 
 
-def _since_ms_for(period: ChartPeriod) -> int:
+def since_ms_for(period: ChartPeriod) -> int:
     now = datetime.now(timezone.utc)
+    if period == ChartPeriod.DAY:
+        delta = timedelta(days=1)
+    if period == ChartPeriod.WEEK:
+        delta = timedelta(days=7)
     if period == ChartPeriod.MONTH:
         delta = timedelta(days=30)
     if period == ChartPeriod.HALF_YEAR:
@@ -64,16 +166,104 @@ def _since_ms_for(period: ChartPeriod) -> int:
     return int((now - delta).timestamp() * 1000)
 
 
-async def prices_chart_for(asset: str, period: ChartPeriod) -> List[Tuple[int, float]]:
+async def prices_chart_for(asset: str, period: ChartPeriod) -> PriceSeries:
     async with aiosqlite.connect(DB_PATH) as db:
         asset_id = await _asset_id(db, asset)
-        since_ms = _since_ms_for(period)
+        since_ms = since_ms_for(period)
         curr = await db.execute(
-            "SELECT ts_ms, price FROM prices WHERE asset_id = ? AND ts_ms >= ?",
+            """SELECT ts_ms, price FROM prices WHERE asset_id = ? AND ts_ms >= ?
+            ORDER BY ts_ms""",
             (asset_id, since_ms),
         )
         rows = await curr.fetchall()
-        return [(int(ts), float(p)) for ts, p in rows]
+        return PriceSeries.from_rows(rows)
+
+
+async def intraday_for(asset: str, since_ms: int) -> PriceSeries:
+    async with aiosqlite.connect(DB_PATH) as db:
+        asset_id = await _asset_id(db, asset)
+        curr = await db.execute(
+            """SELECT ts_ms, price FROM intraday WHERE asset_id = ? AND ts_ms >= ?
+            ORDER BY ts_ms""",
+            (asset_id, since_ms),
+        )
+        rows = await curr.fetchall()
+        return PriceSeries.from_rows(rows)
+
+
+async def insert_intraday(points: Dict[str, PriceSeries]):
+    """Append ticks of several assets in a single transaction."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        rows = []
+        for asset, series in points.items():
+            asset_id = await _asset_id(db, asset)
+            rows.extend((asset_id, ts, price) for ts, price in series.to_rows())
+        await db.executemany(
+            "INSERT INTO intraday (asset_id, ts_ms, price) VALUES (?, ?, ?)", rows
+        )
+        await db.commit()
+
+
+async def prices_history_for(
+    assets: List[str], period: ChartPeriod | None = None, table: str = "prices"
+) -> Dict[str, PriceSeries]:
+    """Cached history of several assets in a single query.
+
+    The full history is returned unless a period is given. `table` is
+    "prices" for daily points or "intraday" for captured ticks.
+    """
+    if not assets:
+        return {}
+    placeholders = ", ".join("?" for _ in assets)
+    since_ms = since_ms_for(period) if period else 0
+    async with aiosqlite.connect(DB_PATH) as db:
+        curr = await db.execute(
+            f"""SELECT a.symbol, p.ts_ms, p.price FROM {table} p
+            JOIN assets a ON a.id = p.asset_id
+            WHERE a.symbol IN ({placeholders}) AND p.ts_ms >= ?
+            ORDER BY p.asset_id, p.ts_ms""",
+            (*assets, since_ms),
+        )
+        rows = await curr.fetchall()
+    # Rows are grouped by asset, so every history is a view into one series
+    series = PriceSeries.from_rows((ts, price) for _, ts, price in rows)
+    result = {asset: PriceSeries.empty() for asset in assets}
+    start = 0
+    for symbol, group in groupby(row[0] for row in rows):
+        end = start + sum(1 for _ in group)
+        result[symbol] = series[start:end]
+        start = end
+    return result
+
+
+async def last_updated_prices(assets: List[str]) -> Dict[str, int]:
+    """last_called_ms of every given asset that is in the cache."""
+    if not assets:
+        return {}
+    placeholders = ", ".join("?" for _ in assets)
+    async with aiosqlite.connect(DB_PATH) as db:
+        curr = await db.execute(
+            f"""SELECT symbol, last_called_ms FROM assets
+            WHERE symbol IN ({placeholders})""",
+            assets,
+        )
+        rows = await curr.fetchall()
+        return {symbol: called for symbol, called in rows}
+
+
+async def latest_price_ts(assets: List[str]) -> int | None:
+    if not assets:
+        return None
+    placeholders = ", ".join("?" for _ in assets)
+    async with aiosqlite.connect(DB_PATH) as db:
+        curr = await db.execute(
+            f"""SELECT MAX(p.ts_ms) FROM prices p
+            JOIN assets a ON a.id = p.asset_id
+            WHERE a.symbol IN ({placeholders})""",
+            assets,
+        )
+        row = await curr.fetchone()
+        return row[0] if row else None
 
 
 async def _asset_id(db: aiosqlite.Connection, asset: str):
@@ -89,53 +279,90 @@ async def _asset_id(db: aiosqlite.Connection, asset: str):
     return result.lastrowid
 
 
-async def add_asset_to_wallet(asset: Asset):
+async def _portfolio_id(db: aiosqlite.Connection, portfolio: str):
+    curr = await db.execute("SELECT id FROM portfolios WHERE name = ?", (portfolio,))
+    row = await curr.fetchone()
+    if row:
+        return row[0]
+    result = await db.execute("INSERT INTO portfolios (name) VALUES (?)", (portfolio,))
+    await db.commit()
+    return result.lastrowid
+
+
+async def add_portfolio(portfolio: str):
     async with aiosqlite.connect(DB_PATH) as db:
+        await _portfolio_id(db, portfolio)
+
+
+async def portfolio_names() -> List[str]:
+    async with aiosqlite.connect(DB_PATH) as db:
+        curr = await db.execute("SELECT name FROM portfolios ORDER BY id")
+        rows = await curr.fetchall()
+        return [name for (name,) in rows]
+
+
+async def add_asset_to_wallet(asset: Asset, portfolio: str = DEFAULT_PORTFOLIO):
+    async with aiosqlite.connect(DB_PATH) as db:
+        portfolio_id = await _portfolio_id(db, portfolio)
         await db.execute(
-            "INSERT INTO wallet (name, amount, price, asset_type) VALUES (?, ?, ?, ?)",
-            (asset.name, asset.amount, asset.avg_price, asset.asset_type.value),
+            """INSERT INTO wallet (portfolio_id, account, name, amount, price, asset_type)
+            VALUES (?, ?, ?, ?, ?, ?)""",
+            (
+                portfolio_id,
+                asset.account,
+                asset.name,
+                asset.amount,
+                asset.avg_price,
+                asset.asset_type.value,
+            ),
         )
         await db.commit()
 
 
-async def update_asset_in_wallet(asset: Asset):
+async def update_asset_in_wallet(asset: Asset, portfolio: str = DEFAULT_PORTFOLIO):
     async with aiosqlite.connect(DB_PATH) as db:
+        portfolio_id = await _portfolio_id(db, portfolio)
         await db.execute(
-            "UPDATE wallet SET amount=?, price=? WHERE name=?",
-            (asset.amount, asset.avg_price, asset.name),
+            """UPDATE wallet SET amount=?, price=?
+            WHERE portfolio_id=? AND account=? AND name=?""",
+            (asset.amount, asset.avg_price, portfolio_id, asset.account, asset.name),
         )
         await db.commit()
 
 
-async def delete_asset_from_wallet(asset: Asset):
+async def delete_asset_from_wallet(asset: Asset, portfolio: str = DEFAULT_PORTFOLIO):
     async with aiosqlite.connect(DB_PATH) as db:
+        portfolio_id = await _portfolio_id(db, portfolio)
         await db.execute(
-            "DELETE FROM wallet WHERE name=?",
-            (asset.name,),
+            "DELETE FROM wallet WHERE portfolio_id=? AND account=? AND name=?",
+            (portfolio_id, asset.account, asset.name),
         )
         await db.commit()
 
 
-async def wallet_assets() -> List[Asset]:
+async def wallet_assets(portfolio: str = DEFAULT_PORTFOLIO) -> List[Asset]:
     async with aiosqlite.connect(DB_PATH) as db:
+        portfolio_id = await _portfolio_id(db, portfolio)
         curr = await db.execute(
-            "SELECT name, amount, price, asset_type FROM wallet",
+            """SELECT name, amount, price, asset_type, account FROM wallet
+            WHERE portfolio_id = ?""",
+            (portfolio_id,),
         )
         rows = await curr.fetchall()
         result = [
-            Asset(AssetType(asset_type), name, amount, price)
-            for name, amount, price, asset_type in rows
+            Asset(AssetType(asset_type), name, amount, price, account)
+            for name, amount, price, asset_type, account in rows
         ]
         return result
 
 
-async def update_prices_data(asset: str, prices: List[Tuple[int, float]]):
+async def update_prices_data(asset: str, prices: PriceSeries):
     async with aiosqlite.connect(DB_PATH) as db:
         asset_id = await _asset_id(db, asset)
         await db.execute("DELETE FROM prices WHERE asset_id = ?", (asset_id,))
         await db.executemany(
             "INSERT INTO prices (asset_id, ts_ms, price) VALUES (?, ?, ?)",
-            ((asset_id, ts, p) for ts, p in prices),
+            ((asset_id, ts, p) for ts, p in prices.to_rows()),
         )
         current_time = time.time() * 1000
         await db.execute(
@@ -143,3 +370,223 @@ async def update_prices_data(asset: str, prices: List[Tuple[int, float]]):
             (current_time, asset_id),
         )
         await db.commit()
+
+
+async def add_alert(rule: AlertRule) -> int:
+    async with aiosqlite.connect(DB_PATH) as db:
+        result = await db.execute(
+            "INSERT INTO alerts (kind, target, direction, threshold) VALUES (?, ?, ?, ?)",
+            (rule.kind.value, rule.target, rule.direction.value, rule.threshold),
+        )
+        await db.commit()
+        return result.lastrowid
+
+
+async def delete_alert(rule: AlertRule):
+    async with aiosqlite.connect(DB_PATH) as db:
+        await db.execute("DELETE FROM alerts WHERE id = ?", (rule.id,))
+        await db.commit()
+
+
+async def alert_rules() -> List[AlertRule]:
+    async with aiosqlite.connect(DB_PATH) as db:
+        curr = await db.execute(
+            "SELECT id, kind, target, direction, threshold, last_fired_ms FROM alerts",
+        )
+        rows = await curr.fetchall()
+        return [
+            AlertRule(
+                AlertKind(kind),
+                target,
+                AlertDirection(direction),
+                threshold,
+                id,
+                last_fired_ms,
+            )
+            for id, kind, target, direction, threshold, last_fired_ms in rows
+        ]
+
+
+async def mark_alerts_fired(alert_ids: List[int], ts_ms: int | None):
+    """Record when rules fired, None re-arms them."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        await db.executemany(
+            "UPDATE alerts SET last_fired_ms = ? WHERE id = ?",
+            ((ts_ms, alert_id) for alert_id in alert_ids),
+        )
+        await db.commit()
+
+
+async def save_snapshots(ts_ms: int, snapshots: List[Tuple[str, TotalStat, list]]):
+    """Store one (portfolio, stat, quotes) snapshot per portfolio in one commit."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        rows = []
+        for portfolio, stat, quotes in snapshots:
+            portfolio_id = await _portfolio_id(db, portfolio)
+            payload = {"quotes": quotes, "assets": stat.to_json()["assets"]}
+            rows.append(
+                (
+                    portfolio_id,
+                    ts_ms,
+                    stat.total_value,
+                    stat.pl_total,
+                    stat.pl_today,
+                    json.dumps(payload, separators=(",", ":")),
+                )
+            )
+        await db.executemany(
+            """INSERT INTO snapshots
+            (portfolio_id, ts_ms, total_value, pl_total, pl_today, payload)
+            VALUES (?, ?, ?, ?, ?, ?)""",
+            rows,
+        )
+        for portfolio_id, *_ in rows:
+            await _thin_snapshots(db, portfolio_id)
+        await db.commit()
+
+
+async def _thin_snapshots(db: aiosqlite.Connection, portfolio_id: int):
+    """Keep the last snapshot of each UTC day, with a payload only on the newest.
+
+    daily_pl reads one row per day and latest_snapshots one row in total, so
+    everything else would only grow the cache.
+    """
+    await db.execute(
+        """DELETE FROM snapshots WHERE portfolio_id = ? AND id NOT IN (
+            SELECT MAX(id) FROM snapshots WHERE portfolio_id = ?
+            GROUP BY date(ts_ms / 1000, 'unixepoch'))""",
+        (portfolio_id, portfolio_id),
+    )
+    await db.execute(
+        """UPDATE snapshots SET payload = '{}'
+        WHERE portfolio_id = ? AND payload != '{}' AND id < (
+            SELECT MAX(id) FROM snapshots WHERE portfolio_id = ?)""",
+        (portfolio_id, portfolio_id),
+    )
+
+
+async def latest_snapshots() -> Dict[str, Tuple[int, dict]]:
+    """Newest snapshot of every portfolio as (ts_ms, payload)."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        curr = await db.execute(
+            """SELECT p.name, s.ts_ms, s.payload FROM snapshots s
+            JOIN portfolios p ON p.id = s.portfolio_id
+            WHERE s.id IN (SELECT MAX(id) FROM snapshots GROUP BY portfolio_id)"""
+        )
+        rows = await curr.fetchall()
+        return {name: (ts_ms, json.loads(payload)) for name, ts_ms, payload in rows}
+
+
+async def daily_pl(
+    portfolio: str = DEFAULT_PORTFOLIO,
+) -> List[Tuple[str, float, float, float]]:
+    """(UTC day, value, total P&L, today P&L) from the last snapshot of each day."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        # SQLite takes bare columns from the row holding MAX(ts_ms)
+        curr = await db.execute(
+            """SELECT date(s.ts_ms / 1000, 'unixepoch') AS day, MAX(s.ts_ms),
+            s.total_value, s.pl_total, s.pl_today FROM snapshots s
+            JOIN portfolios p ON p.id = s.portfolio_id
+            WHERE p.name = ? GROUP BY day ORDER BY day""",
+            (portfolio,),
+        )
+        rows = await curr.fetchall()
+        return [
+            (day, value, pl_total, pl_today)
+            for day, _, value, pl_total, pl_today in rows
+        ]
+
+
+async def symbol_footprint() -> List[SymbolFootprint]:
+    """Daily and intraday points cached per symbol."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        curr = await db.execute(
+            """SELECT a.symbol, COUNT(p.ts_ms), MIN(p.ts_ms), MAX(p.ts_ms),
+            a.last_called_ms FROM assets a LEFT JOIN (
+                SELECT asset_id, ts_ms FROM prices
+                UNION ALL SELECT asset_id, ts_ms FROM intraday
+            ) p ON p.asset_id = a.id
+            GROUP BY a.id"""
+        )
+        rows = await curr.fetchall()
+        total_rows = sum(count for _, count, _, _, _ in rows)
+        # Both tables have the same row layout, so one average row size
+        table_bytes = await _table_bytes(db, "prices", "intraday")
+        row_bytes = table_bytes / total_rows if total_rows else 0
+        return [
+            SymbolFootprint(symbol, count, int(count * row_bytes), first, last, called)
+            for symbol, count, first, last, called in rows
+        ]
+
+
+async def table_footprint(table: str) -> Tuple[int, int]:
+    """Rows and bytes of a table not split by symbol, like snapshots."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        rows = (await (await db.execute(f"SELECT COUNT(*) FROM {table}")).fetchone())[0]
+        return rows, await _table_bytes(db, table)
+
+
+async def _table_bytes(db: aiosqlite.Connection, *tables: str) -> int:
+    placeholders = ", ".join("?" for _ in tables)
+    try:
+        curr = await db.execute(
+            f"""SELECT SUM(pgsize) FROM dbstat WHERE name IN
+            (SELECT name FROM sqlite_master WHERE tbl_name IN ({placeholders}))""",
+            tables,
+        )
+    except aiosqlite.OperationalError:
+        # SQLite built without dbstat: fall back to the whole used file size
+        return (await cache_size())[0]
+    row = await curr.fetchone()
+    return row[0] or 0
+
+
+async def cache_size() -> Tuple[int, int]:
+    """Bytes in use and bytes on the freelist."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        page_size = (await (await db.execute("PRAGMA page_size")).fetchone())[0]
+        pages = (await (await db.execute("PRAGMA page_count")).fetchone())[0]
+        free = (await (await db.execute("PRAGMA freelist_count")).fetchone())[0]
+        return (pages - free) * page_size, free * page_size
+
+
+async def delete_prices_before(table: str, cutoff_ms: int) -> int:
+    async with aiosqlite.connect(DB_PATH) as db:
+        result = await db.execute(f"DELETE FROM {table} WHERE ts_ms < ?", (cutoff_ms,))
+        await db.commit()
+        return result.rowcount
+
+
+async def evict_assets(assets: List[str]):
+    if not assets:
+        return
+    placeholders = ", ".join("?" for _ in assets)
+    async with aiosqlite.connect(DB_PATH) as db:
+        for table in ("prices", "intraday"):
+            await db.execute(
+                f"""DELETE FROM {table} WHERE asset_id IN
+                (SELECT id FROM assets WHERE symbol IN ({placeholders}))""",
+                assets,
+            )
+        await db.execute(f"DELETE FROM assets WHERE symbol IN ({placeholders})", assets)
+        await db.commit()
+
+
+async def ensure_incremental_vacuum():
+    async with aiosqlite.connect(DB_PATH) as db:
+        mode = (await (await db.execute("PRAGMA auto_vacuum")).fetchone())[0]
+        if mode == 2:
+            return
+        # Switching an existing file to incremental mode needs one full VACUUM
+        logging.info("Enabling incremental vacuum on cache")
+        await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        await db.execute("VACUUM")
+
+
+async def incremental_vacuum(pages: int) -> int:
+    """Release up to `pages` free pages, returns how many are still free."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        curr = await db.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+        await curr.fetchall()
+        free = (await (await db.execute("PRAGMA freelist_count")).fetchone())[0]
+        return free
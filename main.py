@@ -1,11 +1,89 @@
 from services.provider import DataProvider
+from services.retention import RetentionService
+from services import scheduler
 from wallet import Wallet
+from data_types import DEFAULT_PORTFOLIO
 from pathlib import Path
 from ui.assets_tui import AssetsTui
+from datetime import datetime
+import argparse
+import asyncio
 import logging
+import db
+import server
+
+
+def _format_ts(ts_ms):
+    if not ts_ms:
+        return "-"
+    return datetime.fromtimestamp(ts_ms / 1000).strftime("%Y-%m-%d")
+
+
+async def print_stats():
+    await db.init_db()
+    used, free = await db.cache_size()
+    footprint = await RetentionService().stats()
+    print(f"{db.DB_PATH}: {used / 1024:.1f} KiB used, {free / 1024:.1f} KiB free")
+    print(f"{'symbol':<12}{'rows':>8}{'KiB':>10}  {'from':<12}{'to':<12}fetched")
+    for f in footprint:
+        print(
+            f"{f.symbol:<12}{f.rows:>8}{f.bytes / 1024:>10.1f}  "
+            f"{_format_ts(f.first_ts_ms):<12}{_format_ts(f.last_ts_ms):<12}"
+            f"{_format_ts(f.last_called_ms)}"
+        )
+    rows, size = await db.table_footprint("snapshots")
+    print(f"{'snapshots':<12}{rows:>8}{size / 1024:>10.1f}")
+
+
+async def print_history(portfolio: str):
+    await db.init_db()
+    print(f"{'day':<12}{'value':>14}{'P&L total':>14}{'P&L day':>14}")
+    for day, value, pl_total, pl_today in await db.daily_pl(portfolio):
+        print(f"{day:<12}{value:>14.2f}{pl_total:>+14.2f}{pl_today:>+14.2f}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="asset-terminal")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="tui",
+        choices=["tui", "stats", "serve", "history"],
+        help="tui (default), stats to print the cache footprint per symbol, "
+        "serve to run the local HTTP API or history to print daily P&L",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="no network: use the last snapshot and cached charts",
+    )
+    parser.add_argument("--portfolio", default=DEFAULT_PORTFOLIO)
+    parser.add_argument(
+        "--wallet",
+        type=Path,
+        help="keep the wallet in this journaled JSON file instead of cache.db",
+    )
+    parser.add_argument(
+        "--crypto-interval",
+        type=float,
+        default=scheduler.CRYPTO_INTERVAL,
+        help="seconds between crypto quote refreshes",
+    )
+    parser.add_argument(
+        "--stock-interval",
+        type=float,
+        default=scheduler.STOCK_INTERVAL,
+        help="seconds between stock quote refreshes while their market is open",
+    )
+    parser.add_argument("--host", default=server.DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=server.DEFAULT_PORT)
+    args = parser.parse_args()
+    if args.command == "stats":
+        asyncio.run(print_stats())
+        raise SystemExit
+    if args.command == "history":
+        asyncio.run(print_history(args.portfolio))
+        raise SystemExit
     log_path = Path("logs/app.log")
     log_path.parent.mkdir(parents=True, exist_ok=True)
     logging.basicConfig(
@@ -15,6 +93,14 @@ if __name__ == "__main__":
         format="%(asctime)s - %(levelname)s - %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
     )
-    provider = DataProvider()
+    refresh = scheduler.RefreshScheduler(args.crypto_interval, args.stock_interval)
+    if args.command == "serve":
+        asyncio.run(
+            server.serve(args.host, args.port, args.offline, args.wallet, refresh)
+        )
+        raise SystemExit
+    provider = DataProvider(
+        offline=args.offline, wallet_path=args.wallet, scheduler=refresh
+    )
     app = AssetsTui(provider)
     app.run()
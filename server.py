@@ -0,0 +1,332 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+from http import HTTPStatus
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from services.provider import DataProvider
+from services.portfolio import View
+from services.scheduler import RefreshScheduler
+from data_types import (
+    Asset,
+    AssetType,
+    ChartPeriod,
+    DEFAULT_PORTFOLIO,
+)
+from ui import helper
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8787
+GZIP_MIN_BYTES = 1024
+SSE_HEARTBEAT = 15
+MAX_BODY_BYTES = 1024 * 1024
+
+
+def _query(url) -> Dict[str, str]:
+    return {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+
+class HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str = ""):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+
+class _Body:
+    """Encoded JSON response with its ETag and a lazily gzipped copy."""
+
+    __slots__ = ("raw", "etag", "_gzipped")
+
+    def __init__(self, payload):
+        self.raw = json.dumps(payload, separators=(",", ":")).encode()
+        self.etag = f'"{hashlib.sha1(self.raw).hexdigest()[:16]}"'
+        self._gzipped: Optional[bytes] = None
+
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.raw)
+        return self._gzipped
+
+
+class ApiServer:
+    """Local JSON/HTTP API over a DataProvider.
+
+    One refresh loop drives the provider exactly like the TUI does; every
+    client is served from the resulting quote and chart caches. Encoded
+    responses are kept until the next refresh, so repeated requests cost a
+    dict lookup and clients holding the current ETag get 304 Not Modified.
+    Refreshed stats are pushed to /events subscribers as server-sent events.
+
+    Routes:
+        GET    /stat?portfolio=&account=
+        GET    /chart/<symbol>?type=crypto|stock&period=day|week|month|half_year|year
+        GET    /wallet?portfolio=
+        POST   /wallet?portfolio=           body: asset json
+        PUT    /wallet?portfolio=           body: asset json
+        DELETE /wallet?portfolio=           body: asset json
+        GET    /history?portfolio=          daily P&L from snapshots
+        GET    /events?portfolio=&account=
+        GET    /requests                    single-flight counters
+    """
+
+    def __init__(
+        self,
+        provider: DataProvider,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+    ):
+        self.provider = provider
+        self.host = host
+        self.port = port
+        self._bodies: Dict[str, _Body] = {}
+        # Event stream queue -> the view it was opened for
+        self._subscribers: Dict[asyncio.Queue, View] = {}
+
+    async def serve_forever(self):
+        await self.provider.init()
+        await self.provider.total_stat()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        logging.info(f"API server listening on {self.host}:{self.port}")
+        asyncio.create_task(self._refresh_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.provider.close()
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(helper.SCHEDULER_TICK)
+            if self._subscribers:
+                # An open event stream is a client waiting for fresh quotes
+                self.provider.scheduler.touch()
+            try:
+                if await self.provider.scheduled_stat():
+                    self._changed()
+            except Exception as e:
+                logging.error(f"API refresh error {e}")
+
+    def _changed(self):
+        self._bodies.clear()
+        for queue, view in self._subscribers.items():
+            queue.put_nowait(self._stat_body(view).raw)
+
+    def _stat_body(self, view: View) -> _Body:
+        return self._cached(f"/stat/{view}", lambda: self._stat_payload(view))
+
+    def _cached(self, key: str, build) -> _Body:
+        body = self._bodies.get(key)
+        if body is None:
+            body = _Body(build())
+            self._bodies[key] = body
+        return body
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                # API clients are the server's users: keep refreshes at full rate
+                self.provider.scheduler.touch()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                url = urlsplit(target)
+                if method == "GET" and url.path == "/events":
+                    try:
+                        view = self._view(_query(url))
+                    except HttpError as e:
+                        error = _Body({"error": str(e)})
+                        await self._respond(writer, e.status, error, headers, False)
+                        break
+                    await self._stream_events(writer, view)
+                    break
+                try:
+                    status, payload = await self._route(method, url, body)
+                except HttpError as e:
+                    status, payload = e.status, _Body({"error": str(e)})
+                except (KeyError, ValueError, TypeError) as e:
+                    status, payload = HTTPStatus.BAD_REQUEST, _Body({"error": str(e)})
+                await self._respond(writer, status, payload, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logging.error(f"API error {e}")
+        finally:
+            writer.close()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            raise ConnectionError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        body: _Body,
+        headers: Dict[str, str],
+        keep_alive: bool,
+    ):
+        response = {
+            "Content-Type": "application/json",
+            "ETag": body.etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+            "Connection": "keep-alive" if keep_alive else "close",
+        }
+        content = body.raw
+        if status == HTTPStatus.OK and body.etag in headers.get("if-none-match", ""):
+            status, content = HTTPStatus.NOT_MODIFIED, b""
+        elif len(content) >= GZIP_MIN_BYTES and "gzip" in headers.get(
+            "accept-encoding", ""
+        ):
+            content = body.gzipped()
+            response["Content-Encoding"] = "gzip"
+        response["Content-Length"] = str(len(content))
+        head = f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in response.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + content)
+        await writer.drain()
+
+    async def _stream_events(self, writer: asyncio.StreamWriter, view: View):
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers[queue] = view
+        try:
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/event-stream\r\n"
+                b"Cache-Control: no-cache\r\n"
+                b"Connection: keep-alive\r\n\r\n"
+            )
+            queue.put_nowait(self._stat_body(view).raw)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT)
+                    writer.write(b"event: stat\ndata: " + event + b"\n\n")
+                except asyncio.TimeoutError:
+                    writer.write(b": ping\n\n")
+                await writer.drain()
+        finally:
+            self._subscribers.pop(queue, None)
+
+    async def _route(
+        self, method: str, url, body: bytes
+    ) -> Tuple[HTTPStatus, _Body]:
+        query = _query(url)
+        parts = [unquote(p) for p in url.path.strip("/").split("/") if p]
+        resource = parts[0] if parts else ""
+        if resource == "stat" and method == "GET":
+            return HTTPStatus.OK, self._stat_body(self._view(query))
+        if resource == "chart" and method == "GET" and len(parts) == 2:
+            return await self._chart(parts[1], query)
+        if resource == "wallet":
+            return await self._wallet(method, query, body)
+        if resource == "history" and method == "GET":
+            portfolio = query.get("portfolio", DEFAULT_PORTFOLIO)
+            rows = await self.provider.daily_pl(portfolio)
+            return HTTPStatus.OK, self._cached(
+                f"/history/{portfolio}",
+                lambda: [
+                    dict(zip(("day", "value", "pl_total", "pl_today"), row))
+                    for row in rows
+                ],
+            )
+        if resource == "requests" and method == "GET":
+            return HTTPStatus.OK, _Body(self.provider.flight_stats().to_json())
+        raise HttpError(HTTPStatus.NOT_FOUND)
+
+    def _view(self, query: Dict[str, str]):
+        view = (query.get("portfolio", DEFAULT_PORTFOLIO), query.get("account"))
+        if view not in self.provider.views():
+            raise HttpError(HTTPStatus.NOT_FOUND, f"Unknown view {view}")
+        return view
+
+    def _stat_payload(self, view: View) -> dict:
+        payload = self.provider.stat_for_view(view).to_json()
+        payload["portfolio"], payload["account"] = view
+        return payload
+
+    async def _chart(
+        self, symbol: str, query: Dict[str, str]
+    ) -> Tuple[HTTPStatus, _Body]:
+        asset_type = AssetType(query.get("type", AssetType.CRYPTO.value))
+        period = ChartPeriod(query.get("period", ChartPeriod.MONTH.value))
+        key = f"/chart/{symbol.lower()}/{asset_type.value}/{period.value}"
+        body = self._bodies.get(key)
+        if body is not None:
+            return HTTPStatus.OK, body
+        data = await self.provider.chart_data_for(symbol, asset_type, period)
+        if data is None:
+            return HTTPStatus.ACCEPTED, _Body({"status": "fetching"})
+        return HTTPStatus.OK, self._cached(key, data.to_json)
+
+    async def _wallet(
+        self, method: str, query: Dict[str, str], body: bytes
+    ) -> Tuple[HTTPStatus, _Body]:
+        portfolio = query.get("portfolio", DEFAULT_PORTFOLIO)
+        if (portfolio, None) not in self.provider.views():
+            raise HttpError(HTTPStatus.NOT_FOUND, f"Unknown portfolio {portfolio}")
+        if method == "GET":
+            return HTTPStatus.OK, self._cached(
+                f"/wallet/{portfolio}",
+                lambda: [a.to_json() for a in self._portfolio_assets(portfolio)],
+            )
+        actions = {
+            "POST": self.provider.add_asset,
+            "PUT": self.provider.update_asset,
+            "DELETE": self.provider.delete_asset,
+        }
+        if method not in actions:
+            raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED)
+        asset = Asset.from_json(json.loads(body))
+        key = (asset.asset_type, asset.account, asset.name)
+        held = any(
+            (a.asset_type, a.account, a.name) == key
+            for a in self._portfolio_assets(portfolio)
+        )
+        if method != "POST" and not held:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"{asset.name} is not in the wallet")
+        await actions[method](asset, portfolio=portfolio)
+        self._changed()
+        return HTTPStatus.OK, _Body(asset.to_json())
+
+    def _portfolio_assets(self, portfolio: str) -> List[Asset]:
+        accounts = self.provider.portfolio.portfolios[portfolio].accounts
+        return [asset for wallet in accounts.values() for asset in wallet.assets()]
+
+
+async def serve(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    offline: bool = False,
+    wallet_path: Path | None = None,
+    scheduler: RefreshScheduler | None = None,
+):
+    provider = DataProvider(
+        offline=offline, wallet_path=wallet_path, scheduler=scheduler
+    )
+    await ApiServer(provider, host, port).serve_forever()
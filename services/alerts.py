@@ -0,0 +1,206 @@
+import logging
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Callable, Dict, List, Optional, Tuple
+
+import db
+from data_types import (
+    AlertDirection,
+    AlertKind,
+    AlertRule,
+    AssetType,
+    FiredAlert,
+    Quote,
+    TotalStat,
+)
+
+SYMBOL_KINDS = (AlertKind.PRICE, AlertKind.CHANGE_PCT)
+
+AlertSink = Callable[[FiredAlert], None]
+
+
+def _threshold(rule: AlertRule) -> float:
+    return rule.threshold
+
+
+def _log_sink(alert: FiredAlert):
+    logging.getLogger("alerts").warning(f"Alert: {alert.describe()}")
+
+
+class _ThresholdIndex:
+    """Rules watching a single value, sorted by threshold per direction.
+
+    Only rules whose threshold lies between the previous and the new value can
+    change state, so an update is two bisects instead of a scan. A rule fires
+    when its condition becomes true and stays silent until the value crosses
+    back, which deduplicates repeated refreshes at the same level. The first
+    value after a restart has nothing to cross from, so there the fired state
+    persisted in last_fired_ms decides.
+    """
+
+    def __init__(self):
+        self.above: List[AlertRule] = []
+        self.below: List[AlertRule] = []
+        self.last: Optional[float] = None
+
+    def _side(self, rule: AlertRule) -> List[AlertRule]:
+        if rule.direction == AlertDirection.ABOVE:
+            return self.above
+        return self.below
+
+    def add(self, rule: AlertRule):
+        insort(self._side(rule), rule, key=_threshold)
+
+    def remove(self, rule: AlertRule):
+        side = self._side(rule)
+        start = bisect_left(side, rule.threshold, key=_threshold)
+        end = bisect_right(side, rule.threshold, key=_threshold)
+        for i in range(start, end):
+            if side[i].id == rule.id:
+                del side[i]
+                return
+
+    def __len__(self) -> int:
+        return len(self.above) + len(self.below)
+
+    def update(self, value: float) -> Tuple[List[AlertRule], List[AlertRule]]:
+        """Rules that became true and rules that stopped being true."""
+        prev = self.last
+        self.last = value
+        if prev is None:
+            true_above = bisect_right(self.above, value, key=_threshold)
+            true_below = bisect_left(self.below, value, key=_threshold)
+            true = self.above[:true_above] + self.below[true_below:]
+            false = self.above[true_above:] + self.below[:true_below]
+            return (
+                [rule for rule in true if rule.last_fired_ms is None],
+                [rule for rule in false if rule.last_fired_ms is not None],
+            )
+        if value > prev:
+            start = bisect_right(self.above, prev, key=_threshold)
+            end = bisect_right(self.above, value, key=_threshold)
+            rearm_start = bisect_left(self.below, prev, key=_threshold)
+            rearm_end = bisect_left(self.below, value, key=_threshold)
+            return self.above[start:end], self.below[rearm_start:rearm_end]
+        if value < prev:
+            start = bisect_left(self.below, value, key=_threshold)
+            end = bisect_left(self.below, prev, key=_threshold)
+            rearm_start = bisect_right(self.above, value, key=_threshold)
+            rearm_end = bisect_right(self.above, prev, key=_threshold)
+            return self.below[start:end], self.above[rearm_start:rearm_end]
+        return [], []
+
+
+class AlertService:
+    def __init__(self):
+        self._indexes: Dict[Tuple[AlertKind, str], _ThresholdIndex] = {}
+        self._rules: Dict[int, AlertRule] = {}
+        self._pending: List[FiredAlert] = []
+        self._sinks: List[AlertSink] = [_log_sink]
+
+    async def init(self):
+        for rule in await db.alert_rules():
+            self._index(rule)
+
+    @staticmethod
+    def _key(kind: AlertKind, target: str) -> Tuple[AlertKind, str]:
+        if kind in SYMBOL_KINDS:
+            return kind, target.upper()
+        return kind, target
+
+    def _index(self, rule: AlertRule):
+        self._rules[rule.id] = rule
+        key = self._key(rule.kind, rule.target)
+        self._indexes.setdefault(key, _ThresholdIndex()).add(rule)
+
+    def rules(self) -> List[AlertRule]:
+        return list(self._rules.values())
+
+    def add_sink(self, sink: AlertSink):
+        self._sinks.append(sink)
+
+    def remove_sink(self, sink: AlertSink):
+        self._sinks.remove(sink)
+
+    async def add_rule(self, rule: AlertRule) -> AlertRule:
+        rule.id = await db.add_alert(rule)
+        self._index(rule)
+        index = self._indexes[self._key(rule.kind, rule.target)]
+        # Already past the threshold: report it on the next evaluation instead
+        # of waiting for the value to cross back and forth.
+        if index.last is not None and rule.is_triggered(index.last):
+            now_ms = int(time.time() * 1000)
+            self._pending.append(FiredAlert(rule, index.last, now_ms))
+        return rule
+
+    async def delete_rule(self, rule: AlertRule):
+        await db.delete_alert(rule)
+        self._rules.pop(rule.id, None)
+        key = self._key(rule.kind, rule.target)
+        index = self._indexes.get(key)
+        if index is None:
+            return
+        index.remove(rule)
+        if not index:
+            self._indexes.pop(key)
+
+    async def evaluate(
+        self,
+        quotes: Dict[Tuple[AssetType, str], Quote],
+        portfolio_totals: Dict[str, TotalStat],
+    ) -> List[FiredAlert]:
+        """Check rules against quotes updated in this refresh round."""
+        now_ms = int(time.time() * 1000)
+        fired, self._pending = self._pending, []
+        rearmed: List[AlertRule] = []
+        for (_, symbol), quote in quotes.items():
+            self._check(AlertKind.PRICE, symbol, quote.price, now_ms, fired, rearmed)
+            self._check(
+                AlertKind.CHANGE_PCT, symbol, quote.change_pct, now_ms, fired, rearmed
+            )
+        for name, stat in portfolio_totals.items():
+            self._check(
+                AlertKind.PL_TOTAL, name, stat.pl_total, now_ms, fired, rearmed
+            )
+            self._check(
+                AlertKind.PORTFOLIO_VALUE,
+                name,
+                stat.total_value,
+                now_ms,
+                fired,
+                rearmed,
+            )
+        # Rules whose value crossed back fire again on the next crossing
+        rearmed = [rule for rule in rearmed if rule.last_fired_ms is not None]
+        if rearmed:
+            for rule in rearmed:
+                rule.last_fired_ms = None
+            await db.mark_alerts_fired([rule.id for rule in rearmed], None)
+        if not fired:
+            return fired
+        for alert in fired:
+            alert.rule.last_fired_ms = now_ms
+        await db.mark_alerts_fired([alert.rule.id for alert in fired], now_ms)
+        for alert in fired:
+            for sink in self._sinks:
+                try:
+                    sink(alert)
+                except Exception as e:
+                    logging.error(f"Alert sink failed: {e}")
+        return fired
+
+    def _check(
+        self,
+        kind: AlertKind,
+        target: str,
+        value: float,
+        now_ms: int,
+        fired: List[FiredAlert],
+        rearmed: List[AlertRule],
+    ):
+        index = self._indexes.get(self._key(kind, target))
+        if index is None:
+            return
+        became_true, became_false = index.update(value)
+        fired.extend(FiredAlert(rule, value, now_ms) for rule in became_true)
+        rearmed.extend(became_false)
@@ -3,26 +3,56 @@ import asyncio
 import httpx
 from typing import List, Tuple, Set, Optional, Dict
 import time
+import numpy as np
 import yfinance as yf
 
 import db
-from data_types import AssetType, ChartPeriod
+from data_types import AssetType, ChartPeriod, PriceSeries
+from services.risk import align_histories, MS_PER_DAY
 
 MAX_DIFF = 1000 * 60 * 60 * 24
+REBASE_TO = 100.0
+
+
+def rebase_histories(
+    histories: Dict[str, PriceSeries], symbols: List[str], step_ms: int = MS_PER_DAY
+) -> Dict[str, PriceSeries]:
+    """Series on one shared timeline, each rebased to 100 at its first point.
+
+    Every result is a suffix of the same timeline: an asset whose history
+    starts later than the others starts at 100 on its own first point.
+    """
+    timeline, matrix = align_histories(histories, symbols, step_ms)
+    if not len(timeline):
+        return {}
+    valid = ~np.isnan(matrix)
+    first = np.where(valid.any(axis=0), valid.argmax(axis=0), len(timeline))
+    base = matrix[np.minimum(first, len(timeline) - 1), np.arange(len(symbols))]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rebased = matrix / base * REBASE_TO
+    return {
+        symbol: PriceSeries(timeline[start:], rebased[start:, column])
+        for column, (symbol, start) in enumerate(zip(symbols, first.tolist()))
+        if start < len(timeline) and base[column] > 0
+    }
 
 
 class ChartService:
-    def __init__(self, symbol_to_name: Dict[str, str]):
+    def __init__(self, symbol_to_name: Dict[str, str], offline: bool = False):
         self.symbol_to_name = symbol_to_name
+        # Offline: serve cached history however old it is, never fetch
+        self.offline = offline
         self._queue: asyncio.Queue[Tuple[str, AssetType]] = asyncio.Queue()
         self._enqueued: Set[Tuple[str, AssetType]] = set()
 
     async def chart_data_for(
         self, asset: str, asset_type: AssetType, period: ChartPeriod = ChartPeriod.MONTH
-    ) -> Optional[List[Tuple[int, float]]]:
+    ) -> Optional[PriceSeries]:
         normalized_name = asset.lower()
         result = await db.get_last_updated_price(normalized_name)
         current_time = time.time() * 1000
+        if self.offline and result:
+            return await db.prices_chart_for(normalized_name, period)
         if not result or (current_time - result) > MAX_DIFF:
             logging.info(f"No data for {asset} chart. Adding to queue")
             self._add_to_fetch_queue(normalized_name, asset_type)
@@ -30,13 +60,36 @@ class ChartService:
         chart = await db.prices_chart_for(normalized_name, period)
         return chart
 
+    async def histories_for(
+        self, assets: List[Tuple[str, AssetType]], period: ChartPeriod
+    ) -> Dict[str, PriceSeries]:
+        """Cached histories of several assets, loaded in one query.
+
+        Stale or missing assets are queued for fetching like in chart_data_for,
+        but whatever is already cached for them is still returned.
+        """
+        symbols = [asset.lower() for asset, _ in assets]
+        updated = await db.last_updated_prices(symbols)
+        current_time = time.time() * 1000
+        for symbol, (_, asset_type) in zip(symbols, assets):
+            last = updated.get(symbol)
+            if not last or (current_time - last) > MAX_DIFF:
+                logging.info(f"No fresh data for {symbol} chart. Adding to queue")
+                self._add_to_fetch_queue(symbol, asset_type)
+        histories = await db.prices_history_for(symbols, period)
+        return {symbol: history for symbol, history in histories.items() if history}
+
     def _add_to_fetch_queue(self, asset: str, asset_type: AssetType):
+        if self.offline:
+            return
         data = (asset, asset_type)
         if data not in self._enqueued:
             self._enqueued.add(data)
             self._queue.put_nowait(data)
 
     def run(self):
+        if self.offline:
+            return
         asyncio.create_task(self._worker())
 
     async def _worker(self):
@@ -56,31 +109,27 @@ class ChartService:
                 logging.error(f"Error {e}")
             await asyncio.sleep(60)
 
-    async def fetch_crypto_chart_data(
-        self, asset_symbol: str
-    ) -> List[Tuple[int, float]]:
+    async def fetch_crypto_chart_data(self, asset_symbol: str) -> PriceSeries:
         name = self.symbol_to_name[asset_symbol]
         logging.info(f"Called fetch_chart_data for {asset_symbol}, name {name}")
         url = f"https://api.coingecko.com/api/v3/coins/{name}/market_chart?vs_currency=usd&days=365&interval=daily"
         async with httpx.AsyncClient() as client:
             r = await client.get(url)
             data = r.json()
-        prices = [(int(ts), float(price)) for ts, price in data.get("prices")]
-        return prices
+        return PriceSeries.from_rows(
+            (int(ts), float(price)) for ts, price in data.get("prices")
+        )
 
-    async def fetch_stock_chart_data(
-        self, asset_symbol: str
-    ) -> List[Tuple[int, float]]:
+    async def fetch_stock_chart_data(self, asset_symbol: str) -> PriceSeries:
         loop = asyncio.get_running_loop()
 
-        def _get() -> List[Tuple[int, float]]:
+        def _get() -> PriceSeries:
             df = yf.Ticker(asset_symbol).history(period="1y", interval="1d")
             if df.empty:
-                return []
-            rows = []
-            for ts, close in df["Close"].items():
-                rows.append((int(ts.value // 1_000_000), float(close)))
-            return rows
+                return PriceSeries.empty()
+            # Index resolution varies with the pandas version, ns is not a given
+            ts = df.index.as_unit("ms").asi8
+            return PriceSeries(ts.astype("int64"), df["Close"].to_numpy("float64"))
 
         data = await loop.run_in_executor(None, _get)
         return data
@@ -0,0 +1,258 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from data_types import Indicator, PriceSeries
+
+MS_PER_YEAR = 1000 * 60 * 60 * 24 * 365
+
+DEFAULT_PARAMS: Dict[Indicator, Tuple] = {
+    Indicator.SMA: (20,),
+    Indicator.EMA: (20,),
+    Indicator.RSI: (14,),
+    Indicator.BOLLINGER: (20, 2.0),
+    Indicator.VOLATILITY: (20,),
+}
+
+# Output lines by name. Names starting with "_" hold internal state needed to
+# extend recursive indicators and are not returned to callers.
+Lines = Dict[str, np.ndarray]
+
+
+def _rolling(
+    values: np.ndarray, window: int, start: int, fn: Callable
+) -> np.ndarray:
+    """Apply fn to every trailing window ending at start..len(values) - 1."""
+    n = len(values)
+    out = np.full(n - start, np.nan)
+    first = max(start, window - 1)
+    if first >= n:
+        return out
+    windows = sliding_window_view(values[first - window + 1 :], window)
+    out[first - start :] = fn(windows, axis=1)
+    return out
+
+
+def _ema(values: np.ndarray, alpha: float, last: float) -> np.ndarray:
+    # Recursive, so a plain loop; it is only walked over points not yet cached
+    out = np.empty(len(values))
+    for i, value in enumerate(values):
+        last = value if np.isnan(last) else last + alpha * (value - last)
+        out[i] = last
+    return out
+
+
+def _last(prev: Lines, name: str) -> float:
+    line = prev.get(name)
+    if line is None or not len(line):
+        return np.nan
+    return float(line[-1])
+
+
+def _sma(
+    ts: np.ndarray, prices: np.ndarray, start: int, prev: Lines, params
+) -> Lines:
+    (window,) = params
+    return {"sma": _rolling(prices, window, start, np.mean)}
+
+
+def _ema_lines(
+    ts: np.ndarray, prices: np.ndarray, start: int, prev: Lines, params
+) -> Lines:
+    (window,) = params
+    alpha = 2 / (window + 1)
+    return {"ema": _ema(prices[start:], alpha, _last(prev, "ema"))}
+
+
+def _bollinger(
+    ts: np.ndarray, prices: np.ndarray, start: int, prev: Lines, params
+) -> Lines:
+    window, width = params
+    mid = _rolling(prices, window, start, np.mean)
+    std = _rolling(prices, window, start, np.std)
+    return {"mid": mid, "upper": mid + width * std, "lower": mid - width * std}
+
+
+def _volatility(
+    ts: np.ndarray, prices: np.ndarray, start: int, prev: Lines, params
+) -> Lines:
+    (window,) = params
+    offset = max(0, start - window)
+    segment = prices[offset:]
+    returns = np.empty(len(segment))
+    returns[0] = np.log(segment[0] / prices[offset - 1]) if offset else np.nan
+    returns[1:] = np.diff(np.log(segment))
+    step_ms = float(np.median(np.diff(ts))) if len(ts) > 1 else 0.0
+    scale = np.sqrt(MS_PER_YEAR / step_ms) if step_ms > 0 else np.nan
+    std = _rolling(returns, window, start - offset, np.std)
+    return {"volatility": std * scale}
+
+
+def _rsi(
+    ts: np.ndarray, prices: np.ndarray, start: int, prev: Lines, params
+) -> Lines:
+    (window,) = params
+    n = len(prices)
+    avg_gain = np.full(n - start, np.nan)
+    avg_loss = np.full(n - start, np.nan)
+    deltas = np.diff(prices, prepend=np.nan)
+    gains = np.clip(deltas, 0, None)
+    losses = np.clip(-deltas, 0, None)
+    last_gain = _last(prev, "_gain")
+    last_loss = _last(prev, "_loss")
+    # Wilder smoothing is recursive, so only the new points are walked; the
+    # seed is a plain mean of the first window of changes.
+    for i in range(max(start, window), n):
+        if i == window:
+            last_gain = gains[1 : window + 1].mean()
+            last_loss = losses[1 : window + 1].mean()
+        else:
+            last_gain = (last_gain * (window - 1) + gains[i]) / window
+            last_loss = (last_loss * (window - 1) + losses[i]) / window
+        avg_gain[i - start] = last_gain
+        avg_loss[i - start] = last_loss
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+    rsi[np.isnan(avg_gain)] = np.nan
+    return {"rsi": rsi, "_gain": avg_gain, "_loss": avg_loss}
+
+
+INDICATORS: Dict[Indicator, Callable[..., Lines]] = {
+    Indicator.SMA: _sma,
+    Indicator.EMA: _ema_lines,
+    Indicator.RSI: _rsi,
+    Indicator.BOLLINGER: _bollinger,
+    Indicator.VOLATILITY: _volatility,
+}
+# Every value depends on all earlier points, not only on a trailing window
+RECURSIVE = {Indicator.EMA, Indicator.RSI}
+
+
+@dataclass
+class _Cached:
+    ts: np.ndarray
+    prices: np.ndarray
+    lines: Lines
+
+
+class IndicatorService:
+    """Indicator values cached per (symbol, indicator, params).
+
+    When a series comes back with the same history plus new points, only the
+    new tail is computed and appended to the cached lines. A history whose
+    window has moved forward reuses the cached points it still overlaps,
+    except for recursive indicators, which are recomputed from the new start.
+    """
+
+    def __init__(self):
+        self._cache: Dict[Tuple[str, Indicator, Tuple], _Cached] = {}
+
+    def compute(
+        self,
+        symbol: str,
+        indicator: Indicator,
+        ts: np.ndarray,
+        prices: np.ndarray,
+        params: Optional[Tuple] = None,
+    ) -> Lines:
+        params = params or DEFAULT_PARAMS[indicator]
+        key = (symbol.lower(), indicator, params)
+        cached = self._cache.get(key)
+        offset, start = self._reusable_prefix(cached, ts, prices)
+        if cached is not None and offset == 0 and start == len(ts) == len(cached.ts):
+            return self._public(cached.lines)
+        if offset and indicator in RECURSIVE:
+            # Cached values were seeded from points no longer in the input
+            start = 0
+        prev = {}
+        if start:
+            prev = {
+                name: line[offset : offset + start]
+                for name, line in cached.lines.items()
+            }
+        if offset and start:
+            prev = self._rewarm(indicator, ts, prices, start, prev, params)
+        new = INDICATORS[indicator](ts, prices, start, prev, params)
+        lines = {
+            name: np.concatenate((prev[name], line)) if start else line
+            for name, line in new.items()
+        }
+        self._cache[key] = _Cached(ts, prices, lines)
+        return self._public(lines)
+
+    def overlays(
+        self,
+        symbol: str,
+        indicators: Iterable[Indicator],
+        history: PriceSeries,
+        since_ms: int,
+    ) -> Dict[Indicator, Dict[str, PriceSeries]]:
+        """Indicator lines over the full history, cut to points from since_ms.
+
+        Computing over the whole cached history keeps the window warm-up out
+        of the visible range.
+        """
+        start = int(np.searchsorted(history.ts, since_ms))
+        visible = history.ts[start:]
+        result = {}
+        for indicator in indicators:
+            lines = self.compute(symbol, indicator, history.ts, history.prices)
+            result[indicator] = {}
+            for name, line in lines.items():
+                line = line[start:]
+                valid = ~np.isnan(line)
+                result[indicator][name] = PriceSeries(visible[valid], line[valid])
+        return result
+
+    @staticmethod
+    def _rewarm(
+        indicator: Indicator,
+        ts: np.ndarray,
+        prices: np.ndarray,
+        start: int,
+        prev: Lines,
+        params: Tuple,
+    ) -> Lines:
+        """Recompute the leading window of a shifted history.
+
+        Cached values there had a full window of older points, a fresh
+        compute of this input leaves them empty.
+        """
+        head_size = min(start, params[0] + 1)
+        head = INDICATORS[indicator](
+            ts[:head_size], prices[:head_size], 0, {}, params
+        )
+        return {
+            name: np.concatenate((head[name], line[head_size:]))
+            for name, line in prev.items()
+        }
+
+    @staticmethod
+    def _public(lines: Lines) -> Lines:
+        return {
+            name: line for name, line in lines.items() if not name.startswith("_")
+        }
+
+    @staticmethod
+    def _reusable_prefix(
+        cached: Optional[_Cached], ts: np.ndarray, prices: np.ndarray
+    ) -> Tuple[int, int]:
+        """(offset, count): the first `count` points of this history were
+        already computed and sit at `offset` in the cached one.
+
+        Histories are a moving window, so the cached series usually starts
+        earlier than the new one and the two are aligned on ts[0].
+        """
+        if cached is None or not len(ts) or not len(cached.ts):
+            return 0, 0
+        offset = int(np.searchsorted(cached.ts, ts[0]))
+        if offset == len(cached.ts) or cached.ts[offset] != ts[0]:
+            return 0, 0
+        size = min(len(ts), len(cached.ts) - offset)
+        same = cached.ts[offset : offset + size] == ts[:size]
+        same &= cached.prices[offset : offset + size] == prices[:size]
+        if same.all():
+            return offset, size
+        return offset, int(np.argmin(same))
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import db
+from data_types import AssetType, ChartPeriod, PriceSeries, Quote
+
+RING_SIZE = 512
+FLUSH_INTERVAL = 60 * 5
+# Bucket used to put ticks of several symbols on one comparison timeline
+COMPARE_STEP_MS = 1000 * 60 * 5
+
+
+class _Ring:
+    """Fixed-size buffer of the newest ticks of one symbol.
+
+    `pending` counts the newest points not yet written to the database. If
+    flushes fall behind by more than the capacity, the oldest pending points
+    are overwritten and lost.
+    """
+
+    __slots__ = ("ts", "prices", "start", "size", "pending")
+
+    def __init__(self, capacity: int):
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.prices = np.zeros(capacity, dtype=np.float64)
+        self.start = 0
+        self.size = 0
+        self.pending = 0
+
+    def append(self, ts_ms: int, price: float):
+        capacity = len(self.ts)
+        end = (self.start + self.size) % capacity
+        if self.size == capacity:
+            self.start = (self.start + 1) % capacity
+        else:
+            self.size += 1
+        self.ts[end] = ts_ms
+        self.prices[end] = price
+        self.pending = min(self.pending + 1, capacity)
+
+    def newest(self, count: int) -> PriceSeries:
+        index = (self.start + self.size - count + np.arange(count)) % len(self.ts)
+        return PriceSeries(self.ts[index], self.prices[index])
+
+
+class IntradayService:
+    """Captures every refreshed quote as an intraday tick.
+
+    Ticks go to a per-symbol ring buffer and are written to the intraday
+    table in one transaction per flush, not one write per tick. Reads merge
+    the flushed points with whatever is still pending in memory.
+    """
+
+    def __init__(
+        self, capacity: int = RING_SIZE, flush_interval: float = FLUSH_INTERVAL
+    ):
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self._rings: Dict[str, _Ring] = {}
+        self._lock = asyncio.Lock()
+
+    def run(self):
+        asyncio.create_task(self._worker())
+
+    async def _worker(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Intraday flush error {e}")
+
+    def record(self, quotes: Dict[Tuple[AssetType, str], Quote], ts_ms: int):
+        for (_, symbol), quote in quotes.items():
+            symbol = symbol.lower()
+            ring = self._rings.get(symbol)
+            if ring is None:
+                ring = self._rings[symbol] = _Ring(self.capacity)
+            ring.append(ts_ms, quote.price)
+
+    async def flush(self) -> int:
+        """Write every pending tick, returns how many were written."""
+        async with self._lock:
+            pending = {
+                symbol: (ring, ring.pending)
+                for symbol, ring in self._rings.items()
+                if ring.pending
+            }
+            if not pending:
+                return 0
+            points = {
+                symbol: ring.newest(count) for symbol, (ring, count) in pending.items()
+            }
+            await db.insert_intraday(points)
+            # Ticks recorded during the write stay pending for the next flush
+            for ring, count in pending.values():
+                ring.pending -= count
+            return sum(count for _, count in pending.values())
+
+    async def series_for(self, symbol: str, period: ChartPeriod) -> PriceSeries:
+        symbol = symbol.lower()
+        since_ms = db.since_ms_for(period)
+        flushed = await db.intraday_for(symbol, since_ms)
+        return self._with_pending(symbol, flushed, since_ms)
+
+    async def histories_for(
+        self, symbols: List[str], period: ChartPeriod
+    ) -> Dict[str, PriceSeries]:
+        symbols = [symbol.lower() for symbol in symbols]
+        since_ms = db.since_ms_for(period)
+        flushed = await db.prices_history_for(symbols, period, table="intraday")
+        histories = {
+            symbol: self._with_pending(symbol, flushed[symbol], since_ms)
+            for symbol in symbols
+        }
+        return {symbol: history for symbol, history in histories.items() if history}
+
+    def _with_pending(
+        self, symbol: str, flushed: PriceSeries, since_ms: int
+    ) -> PriceSeries:
+        ring = self._rings.get(symbol)
+        if ring is None or not ring.size:
+            return flushed
+        if len(flushed):
+            since_ms = max(since_ms, int(flushed.ts[-1]) + 1)
+        buffered = ring.newest(ring.size).between(since_ms)
+        if not len(buffered):
+            return flushed
+        return PriceSeries(
+            np.concatenate((flushed.ts, buffered.ts)),
+            np.concatenate((flushed.prices, buffered.prices)),
+        )
@@ -1,47 +1,151 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set, Tuple
 import httpx
 import asyncio
 import logging
 import yfinance as yf
 
-from data_types import TotalStat, AssetStat, Asset, AssetType
-from wallet import Wallet
+from data_types import (
+    TotalStat,
+    AssetStat,
+    Asset,
+    AssetType,
+    Quote,
+    DEFAULT_PORTFOLIO,
+)
+from wallet import Wallet, Portfolio
 import db
 
+# (portfolio name, account name); account None means the portfolio aggregate
+View = Tuple[str, Optional[str]]
+
 
 class PortfolioService:
+    def __init__(self, store=None):
+        # Wallet persistence: the db module (cache.db) unless a WalletJournal
+        # is given. Only one store is written, so they can't diverge.
+        self.store = store or db
+        self.portfolios: Dict[str, Portfolio] = {}
+        self.view: View = (DEFAULT_PORTFOLIO, None)
+        self._quotes: Dict[Tuple[AssetType, str], Quote] = {}
+        # Snapshot time of quotes restored from disk and not refreshed since
+        self._snapshot_ms: Dict[Tuple[AssetType, str], int] = {}
+        self._totals: Dict[View, TotalStat] = {}
 
     async def init(self):
-        assets = await db.wallet_assets()
-        self.wallet = Wallet.from_asset_list(assets)
+        for name in await self.store.portfolio_names():
+            assets = await self.store.wallet_assets(name)
+            self.portfolios[name] = Portfolio.from_asset_list(name, assets)
+        if DEFAULT_PORTFOLIO not in self.portfolios:
+            self.portfolios[DEFAULT_PORTFOLIO] = Portfolio(DEFAULT_PORTFOLIO, {})
+        await self.restore_snapshot()
+
+    async def restore_snapshot(self):
+        """Seed quotes from the newest persisted snapshots.
+
+        Stats can then be rendered before the first network round; they carry
+        the snapshot time in as_of_ms until every quote they use is refreshed.
+        """
+        for ts_ms, payload in (await db.latest_snapshots()).values():
+            for asset_type, name, price, change_24h in payload["quotes"]:
+                key = (AssetType(asset_type), name)
+                if self._snapshot_ms.get(key, -1) < ts_ms:
+                    self._quotes[key] = Quote(price, change_24h)
+                    self._snapshot_ms[key] = ts_ms
+        self._materialize()
+
+    async def save_snapshot(self, ts_ms: int):
+        """Persist the aggregate stat and quotes of every portfolio."""
+        snapshots = []
+        for name in self.portfolios:
+            wallet = self._wallet_for((name, None))
+            quotes = [
+                [asset.asset_type.value, asset.name, quote.price, quote.change_24h]
+                for asset in wallet.assets()
+                if (quote := self._quotes.get((asset.asset_type, asset.name)))
+            ]
+            snapshots.append((name, self._totals[(name, None)], quotes))
+        await db.save_snapshots(ts_ms, snapshots)
+
+    @property
+    def wallet(self) -> Wallet:
+        return self._wallet_for(self.view)
+
+    def _wallet_for(self, view: View) -> Wallet:
+        portfolio, account = view
+        if account is None:
+            return self.portfolios[portfolio].aggregate()
+        return self.portfolios[portfolio].account(account)
+
+    def views(self) -> List[View]:
+        result: List[View] = []
+        for name, portfolio in self.portfolios.items():
+            result.append((name, None))
+            result.extend((name, account) for account in sorted(portfolio.accounts))
+        return result
+
+    def symbols(self) -> Tuple[Set[str], Set[str]]:
+        """Unique crypto and stock tickers held across every portfolio."""
+        crypto: Set[str] = set()
+        stocks: Set[str] = set()
+        for portfolio in self.portfolios.values():
+            p_crypto, p_stocks = portfolio.symbols()
+            crypto |= p_crypto
+            stocks |= p_stocks
+        return crypto, stocks
+
+    async def add_portfolio(self, name: str):
+        await self.store.add_portfolio(name)
+        self.portfolios.setdefault(name, Portfolio(name, {}))
+
+    def select_view(self, portfolio: str, account: Optional[str] = None) -> TotalStat:
+        self.view = (portfolio, account)
+        return self.current_stat()
+
+    def current_stat(self) -> TotalStat:
+        return self.stat_for_view(self.view)
+
+    def stat_for_view(self, view: View) -> TotalStat:
+        stat = self._totals.get(view)
+        if stat is None:
+            stat = self._stat_for(self._wallet_for(view))
+            self._totals[view] = stat
+        return stat
 
     async def total_stat(self) -> TotalStat:
-        crypto = self.wallet.crypto.keys()
-        stocks = self.wallet.stocks.keys()
+        await self.refresh_quotes()
+        return self.current_stat()
+
+    async def refresh_quotes(
+        self,
+        crypto: Optional[Set[str]] = None,
+        stocks: Optional[Set[str]] = None,
+    ) -> Dict[Tuple[AssetType, str], Quote]:
+        """Fetch fresh quotes and return the ones updated by this round.
+
+        Without arguments every held symbol is refreshed.
+        """
+        if crypto is None and stocks is None:
+            crypto, stocks = self.symbols()
+        crypto = crypto or set()
+        stocks = stocks or set()
         crypto_market, stok_market = await asyncio.gather(
-            self.get_crypto_info(crypto), self.get_stocks_info(stocks)
+            self.get_crypto_info(crypto),
+            self.get_stocks_info(stocks),
+            return_exceptions=True,
         )
-        stats: List[AssetStat] = []
-        total_today = 0
-        total_all = 0
-        total_value = 0
-        for coin in crypto:
-            meta = crypto_market.get(coin)
-            price = float(meta["current_price"])
-            change_24h = float(meta["price_change_24h"])
-            pl_today = self.wallet.crypto[coin].amount * change_24h
-            pl_total = self.wallet.crypto[coin].amount * (
-                price - self.wallet.crypto[coin].avg_price
-            )
-            value = self.wallet.crypto[coin].amount * price
-            stats.append(
-                AssetStat(self.wallet.crypto[coin], price, value, pl_today, pl_total)
+        # An unreachable source keeps its last (possibly snapshot) quotes
+        if isinstance(crypto_market, Exception):
+            logging.error(f"Crypto quotes unavailable {crypto_market!r}")
+            crypto_market, crypto = {}, set()
+        if isinstance(stok_market, Exception):
+            logging.error(f"Stock quotes unavailable {stok_market!r}")
+            stok_market = {}
+        updated: Dict[Tuple[AssetType, str], Quote] = {}
+        for coin, meta in crypto_market.items():
+            updated[(AssetType.CRYPTO, coin)] = Quote(
+                float(meta["current_price"]), float(meta["price_change_24h"])
             )
-            total_today += pl_today
-            total_all += pl_total
-            total_value += value
-        for stock in stocks:
-            meta = stok_market.get(stock)
+        for stock, meta in stok_market.items():
             try:
                 price = float(meta["currentPrice"])
             except KeyError as e:
@@ -49,22 +153,53 @@ class PortfolioService:
                     f"Stock {stock} doesn't have currentPrice, setting regularMarketPrice"
                 )
                 price = float(meta["regularMarketPrice"])
-            change_24h = float(meta["regularMarketChange"])
-            pl_today = self.wallet.stocks[stock].amount * change_24h
-            pl_total = self.wallet.stocks[stock].amount * (
-                price - self.wallet.stocks[stock].avg_price
-            )
-            value = self.wallet.stocks[stock].amount * price
-            stats.append(
-                AssetStat(self.wallet.stocks[stock], price, value, pl_today, pl_total)
+            updated[(AssetType.STOCK, stock)] = Quote(
+                price, float(meta["regularMarketChange"])
             )
+        for symbol in crypto - crypto_market.keys():
+            logging.error(f"No quote for {symbol}, skipping")
+        self._quotes.update(updated)
+        for key in updated:
+            self._snapshot_ms.pop(key, None)
+        self._materialize()
+        return updated
+
+    def portfolio_totals(self) -> Dict[str, TotalStat]:
+        return {name: self._totals[(name, None)] for name in self.portfolios}
+
+    def _materialize(self):
+        """Recompute the cached TotalStat of every view from the last quotes."""
+        self._totals = {
+            view: self._stat_for(self._wallet_for(view)) for view in self.views()
+        }
+
+    def _stat_for(self, wallet: Wallet) -> TotalStat:
+        stats: List[AssetStat] = []
+        total_today = 0
+        total_all = 0
+        total_value = 0
+        as_of_ms = None
+        for asset in wallet.assets():
+            key = (asset.asset_type, asset.name)
+            quote = self._quotes.get(key)
+            if quote is None:
+                continue
+            snapshot_ms = self._snapshot_ms.get(key)
+            if snapshot_ms is not None:
+                as_of_ms = min(as_of_ms or snapshot_ms, snapshot_ms)
+            pl_today = asset.amount * quote.change_24h
+            pl_total = asset.amount * (quote.price - asset.avg_price)
+            value = asset.amount * quote.price
+            stats.append(AssetStat(asset, quote.price, value, pl_today, pl_total))
             total_today += pl_today
             total_all += pl_total
             total_value += value
-        return TotalStat(total_value, total_all, total_today, stats)
+        return TotalStat(total_value, total_all, total_today, stats, as_of_ms)
 
     async def get_crypto_info(self, assets: List[str]) -> Dict[str, Dict[str, Any]]:
         result = {}
+        if not assets:
+            return result
         assets_keys = [a.lower() for a in assets]
         url = "https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=100&page=1"
         async with httpx.AsyncClient() as client:
@@ -83,8 +218,12 @@ class PortfolioService:
         loop = asyncio.get_running_loop()
         return await loop.run_in_executor(None, lambda: (stock, yf.Ticker(stock).info))
 
-    async def add_asset(self, asset: Asset):
-        existing = self._has_asset_in_wallet(asset)
+    def _current_portfolio(self, name: Optional[str] = None) -> Portfolio:
+        return self.portfolios[name or self.view[0]]
+
+    async def add_asset(self, asset: Asset, portfolio_name: Optional[str] = None):
+        portfolio = self._current_portfolio(portfolio_name)
+        existing = self._has_asset_in_wallet(asset, portfolio)
         logging.info(f"Has in wallet {existing}")
         if existing:
             avg_price = (
@@ -93,33 +232,50 @@ class PortfolioService:
             ) / (existing.amount + asset.amount)
             asset.amount = asset.amount + existing.amount
             asset.avg_price = avg_price
-            await db.update_asset_in_wallet(asset)
-        else:
-            await db.add_asset_to_wallet(asset)
-        if asset.asset_type == AssetType.CRYPTO:
-            self.wallet.crypto[asset.name] = asset
+            await self.store.update_asset_in_wallet(asset, portfolio.name)
         else:
-            self.wallet.stocks[asset.name] = asset
-
-    def _has_asset_in_wallet(self, asset: Asset) -> Asset | None:
-        if asset.asset_type == AssetType.CRYPTO:
-            if asset.name in self.wallet.crypto.keys():
-                return self.wallet.crypto[asset.name]
-        if asset.asset_type == AssetType.STOCK:
-            if asset.name in self.wallet.stocks.keys():
-                return self.wallet.stocks[asset.name]
-        return None
-
-    async def update_asset(self, asset: Asset):
-        await db.update_asset_in_wallet(asset)
-        if asset.asset_type == AssetType.CRYPTO:
-            self.wallet.crypto[asset.name] = asset
-        else:
-            self.wallet.stocks[asset.name] = asset
-
-    async def delete_asset(self, asset: Asset):
-        await db.delete_asset_from_wallet(asset)
-        if asset.asset_type == AssetType.CRYPTO:
-            self.wallet.crypto.pop(asset.name)
-        if asset.asset_type == AssetType.STOCK:
-            self.wallet.stocks.pop(asset.name)
+            await self.store.add_asset_to_wallet(asset, portfolio.name)
+        portfolio.account(asset.account).holdings(asset.asset_type)[asset.name] = asset
+        self._materialize()
+
+    def _has_asset_in_wallet(self, asset: Asset, portfolio: Portfolio) -> Asset | None:
+        wallet = portfolio.accounts.get(asset.account)
+        if wallet is None:
+            return None
+        return wallet.holdings(asset.asset_type).get(asset.name)
+
+    async def update_asset(
+        self,
+        asset: Asset,
+        original: Asset | None = None,
+        portfolio_name: Optional[str] = None,
+    ):
+        """Overwrite a holding with the edited `asset`.
+
+        If the edit changed the account, type or ticker of `original`, the
+        holding is deleted where it was and added (merged if already held)
+        where it goes, since the store keys rows on exactly those fields.
+        """
+        moved = original is not None and (
+            (original.account, original.asset_type, original.name)
+            != (asset.account, asset.asset_type, asset.name)
+        )
+        if moved:
+            await self.delete_asset(original, portfolio_name)
+            await self.add_asset(asset, portfolio_name)
+            return
+        portfolio = self._current_portfolio(portfolio_name)
+        await self.store.update_asset_in_wallet(asset, portfolio.name)
+        portfolio.account(asset.account).holdings(asset.asset_type)[asset.name] = asset
+        self._materialize()
+
+    async def delete_asset(self, asset: Asset, portfolio_name: Optional[str] = None):
+        portfolio = self._current_portfolio(portfolio_name)
+        await self.store.delete_asset_from_wallet(asset, portfolio.name)
+        wallet = portfolio.account(asset.account)
+        wallet.holdings(asset.asset_type).pop(asset.name)
+        if not wallet.assets():
+            portfolio.accounts.pop(asset.account)
+            if self.view == (portfolio.name, asset.account):
+                self.view = (portfolio.name, None)
+        self._materialize()
@@ -1,12 +1,36 @@
+import asyncio
 import json
-from typing import Optional, List, Tuple
+import logging
+import time
+from typing import Optional, List, Tuple, Dict, Iterable
+from pathlib import Path
 
-from wallet import Wallet
-from services.chart import ChartService
-from services.portfolio import PortfolioService
-from data_types import AssetType, TotalStat, ChartPeriod, Asset
+from wallet import Wallet, WalletJournal
+from services.chart import ChartService, rebase_histories
+from services.portfolio import PortfolioService, View
+from services.alerts import AlertService
+from services.indicators import IndicatorService
+from services.risk import RiskService
+from services.retention import RetentionService, RetentionPolicy
+from services.scheduler import RefreshScheduler
+from services.intraday import IntradayService, FLUSH_INTERVAL, COMPARE_STEP_MS
+from services.singleflight import SingleFlight, FlightStats
+from data_types import (
+    AssetType,
+    TotalStat,
+    ChartPeriod,
+    Asset,
+    AlertRule,
+    Indicator,
+    RiskStat,
+    PriceSeries,
+)
 import db
 
+QUOTES_KEY = "quotes"
+# Minimum time between two persisted portfolio snapshots
+SNAPSHOT_INTERVAL_MS = 1000 * 60 * 5
+
 
 def _load_symbol_map():
     with open("crypto_mapping.json", "r", encoding="utf-8") as f:
@@ -15,35 +39,195 @@ def _load_symbol_map():
 
 
 class DataProvider:
-    def __init__(self):
-        self.charts = ChartService(_load_symbol_map())
-        self.portfolio = PortfolioService()
+    def __init__(
+        self,
+        retention: RetentionPolicy | None = None,
+        offline: bool = False,
+        flush_interval: float = FLUSH_INTERVAL,
+        wallet_path: Path | None = None,
+        scheduler: RefreshScheduler | None = None,
+    ):
+        # Offline: no network at all, stats come from snapshots and charts
+        # from whatever history is cached
+        self.offline = offline
+        self.charts = ChartService(_load_symbol_map(), offline)
+        # A wallet file replaces the wallet tables of cache.db as the store
+        self.wallet_store = WalletJournal(wallet_path) if wallet_path else None
+        self.portfolio = PortfolioService(self.wallet_store)
+        self.alerts = AlertService()
+        self.indicators = IndicatorService()
+        self.risk = RiskService()
+        self.retention = RetentionService(retention)
+        self.scheduler = scheduler or RefreshScheduler()
+        self.flights = SingleFlight()
+        self.intraday = IntradayService(flush_interval=flush_interval)
+        self._last_snapshot_ms = 0
 
     async def init(self):
         await db.init_db()
         await self.portfolio.init()
-        await self._pre_cache_wallet()
+        await self.alerts.init()
         self.charts.run()
+        # Queueing chart history for every holding reads the cache once per
+        # symbol, so it runs in the background and the snapshot renders first
+        asyncio.create_task(self._pre_cache_wallet())
+        self.retention.run(self._held_symbols)
+        if not self.offline:
+            self.intraday.run()
+
+    async def close(self):
+        """Write ticks still pending in the intraday buffers."""
+        await self.intraday.flush()
+        if self.wallet_store is not None:
+            self.wallet_store.close()
+
+    def _held_symbols(self) -> List[str]:
+        crypto, stocks = self.portfolio.symbols()
+        return [*crypto, *stocks]
 
     async def _pre_cache_wallet(self):
-        for stock in self.portfolio.wallet.stocks.keys():
-            await self.charts.chart_data_for(stock, AssetType.STOCK)
-        for crypto in self.portfolio.wallet.crypto.keys():
-            await self.charts.chart_data_for(crypto, AssetType.CRYPTO)
+        crypto, stocks = self.portfolio.symbols()
+        try:
+            for stock in stocks:
+                await self.charts.chart_data_for(stock, AssetType.STOCK)
+            for coin in crypto:
+                await self.charts.chart_data_for(coin, AssetType.CRYPTO)
+        except Exception as e:
+            logging.error(f"Pre-cache error {e}")
 
     async def total_stat(self) -> TotalStat:
-        return await self.portfolio.total_stat()
+        return await self.flights.refresh(QUOTES_KEY, self._refresh_all)
+
+    async def scheduled_stat(self) -> Optional[TotalStat]:
+        """Refresh only the quote groups that are due, None if none is.
+
+        A tick arriving while quotes are being fetched joins that fetch
+        instead of starting an overlapping network round.
+        """
+        return await self.flights.do(QUOTES_KEY, self._refresh_due)
+
+    def flight_stats(self) -> FlightStats:
+        return self.flights.stats
+
+    async def _refresh_all(self) -> TotalStat:
+        crypto, stocks = self.portfolio.symbols()
+        return await self._refresh(crypto, stocks, self.scheduler.groups(stocks))
+
+    async def _refresh_due(self) -> Optional[TotalStat]:
+        crypto, stocks, groups = self.scheduler.due(*self.portfolio.symbols())
+        if not groups:
+            return None
+        return await self._refresh(crypto, stocks, groups)
+
+    async def _refresh(self, crypto, stocks, groups: List[str]) -> TotalStat:
+        if self.offline:
+            self.scheduler.mark_refreshed(groups)
+            return self.portfolio.current_stat()
+        quotes = await self.portfolio.refresh_quotes(crypto, stocks)
+        self.intraday.record(quotes, int(time.time() * 1000))
+        self.scheduler.mark_refreshed(groups)
+        await self.alerts.evaluate(quotes, self.portfolio.portfolio_totals())
+        if quotes:
+            await self._save_snapshot()
+        return self.portfolio.current_stat()
+
+    async def _save_snapshot(self):
+        now_ms = int(time.time() * 1000)
+        if now_ms - self._last_snapshot_ms < SNAPSHOT_INTERVAL_MS:
+            return
+        self._last_snapshot_ms = now_ms
+        await self.portfolio.save_snapshot(now_ms)
+
+    def current_stat(self) -> TotalStat:
+        """Latest stat of the current view without refreshing anything."""
+        return self.portfolio.current_stat()
+
+    async def daily_pl(self, portfolio: Optional[str] = None):
+        return await db.daily_pl(portfolio or self.portfolio.view[0])
+
+    def views(self) -> List[View]:
+        return self.portfolio.views()
+
+    def current_view(self) -> View:
+        return self.portfolio.view
+
+    def stat_for_view(self, view: View) -> TotalStat:
+        return self.portfolio.stat_for_view(view)
+
+    def select_view(self, portfolio: str, account: Optional[str] = None) -> TotalStat:
+        return self.portfolio.select_view(portfolio, account)
+
+    async def add_portfolio(self, name: str):
+        return await self.portfolio.add_portfolio(name)
 
     async def chart_data_for(
         self, asset: str, asset_type: AssetType, period: ChartPeriod = ChartPeriod.MONTH
-    ) -> Optional[List[Tuple[int, float]]]:
-        return await self.charts.chart_data_for(asset, asset_type, period)
+    ) -> Optional[PriceSeries]:
+        key = ("chart", asset.lower(), asset_type, period)
+        if period.intraday:
+            return await self.flights.do(
+                key, lambda: self.intraday.series_for(asset, period)
+            )
+        return await self.flights.do(
+            key, lambda: self.charts.chart_data_for(asset, asset_type, period)
+        )
+
+    async def comparison_for(
+        self, assets: List[Tuple[str, AssetType]], period: ChartPeriod
+    ) -> Dict[str, PriceSeries]:
+        """Histories of the given assets rebased to 100 on a shared timeline."""
+        symbols = [asset.lower() for asset, _ in assets]
+        if period.intraday:
+            histories = await self.intraday.histories_for(symbols, period)
+            return rebase_histories(histories, symbols, COMPARE_STEP_MS)
+        histories = await self.charts.histories_for(assets, period)
+        return rebase_histories(histories, symbols)
+
+    async def indicators_for(
+        self,
+        asset: str,
+        asset_type: AssetType,
+        indicators: Iterable[Indicator],
+        since_ms: int,
+        intraday: bool = False,
+    ) -> Dict[Indicator, Dict[str, PriceSeries]]:
+        """Indicator lines from since_ms, over daily or intraday history."""
+        period = ChartPeriod.WEEK if intraday else ChartPeriod.YEAR
+        history = await self.chart_data_for(asset, asset_type, period)
+        if not history:
+            return {}
+        # Daily and tick series of a symbol are cached as separate histories
+        symbol = f"{asset}:intraday" if intraday else asset
+        return self.indicators.overlays(symbol, indicators, history, since_ms)
+
+    async def risk_stat(self, benchmark: Optional[str] = None) -> Optional[RiskStat]:
+        if benchmark:
+            asset_type = AssetType.STOCK
+            if benchmark.lower() in self.charts.symbol_to_name:
+                asset_type = AssetType.CRYPTO
+            # Queues the benchmark history for fetching if it isn't cached yet
+            await self.charts.chart_data_for(benchmark, asset_type)
+        return await self.risk.risk_for(self.portfolio.wallet, benchmark)
+
+    async def add_asset(self, asset: Asset, portfolio: Optional[str] = None):
+        return await self.portfolio.add_asset(asset, portfolio)
+
+    async def update_asset(
+        self,
+        asset: Asset,
+        original: Asset | None = None,
+        portfolio: Optional[str] = None,
+    ):
+        return await self.portfolio.update_asset(asset, original, portfolio)
+
+    async def delete_asset(self, asset: Asset, portfolio: Optional[str] = None):
+        return await self.portfolio.delete_asset(asset, portfolio)
 
-    async def add_asset(self, asset: Asset):
-        return await self.portfolio.add_asset(asset)
+    async def add_alert(self, rule: AlertRule) -> AlertRule:
+        return await self.alerts.add_rule(rule)
 
-    async def update_asset(self, asset: Asset):
-        return await self.portfolio.update_asset(asset)
+    def alert_rules(self) -> List[AlertRule]:
+        return self.alerts.rules()
 
-    async def delete_asset(self, asset: Asset):
-        return await self.portfolio.delete_asset(asset)
+    async def delete_alert(self, rule: AlertRule):
+        return await self.alerts.delete_rule(rule)
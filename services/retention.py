@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Set
+
+import db
+from data_types import SymbolFootprint
+
+DAY_MS = 1000 * 60 * 60 * 24
+MAINTENANCE_INTERVAL = 60 * 10
+VACUUM_STEP_PAGES = 64
+VACUUM_PAUSE = 0.05
+
+
+@dataclass
+class RetentionPolicy:
+    max_bytes: int = 64 * 1024 * 1024
+    max_rows: int = 2_000_000
+    # Symbols outside every wallet that weren't fetched for this long are dropped
+    unused_ttl_ms: int = 30 * DAY_MS
+    # Oldest point kept per resolution, keyed by table
+    windows_ms: Dict[str, int] = field(
+        default_factory=lambda: {
+            "prices": 400 * DAY_MS,
+            "intraday": 8 * DAY_MS,
+            "snapshots": 400 * DAY_MS,
+        }
+    )
+
+
+@dataclass
+class RetentionReport:
+    trimmed_rows: int
+    evicted: List[str]
+
+
+class RetentionService:
+    """Keeps cache.db inside its size and row budget.
+
+    Points older than the per-resolution window are trimmed, then symbols no
+    wallet holds are evicted in least recently fetched order (last_called_ms)
+    until the budget fits. Freed pages are returned in small incremental
+    vacuum steps so chart reads never wait behind a full VACUUM.
+    """
+
+    def __init__(self, policy: RetentionPolicy | None = None):
+        self.policy = policy or RetentionPolicy()
+
+    def run(self, held_symbols):
+        asyncio.create_task(self._worker(held_symbols))
+
+    async def _worker(self, held_symbols):
+        await db.ensure_incremental_vacuum()
+        while True:
+            try:
+                held = {symbol.lower() for symbol in held_symbols()}
+                report = await self.enforce(held)
+                if report.trimmed_rows or report.evicted:
+                    logging.info(
+                        f"Retention trimmed {report.trimmed_rows} rows, "
+                        f"evicted {report.evicted}"
+                    )
+                await self.vacuum()
+            except Exception as e:
+                logging.error(f"Retention error {e}")
+            await asyncio.sleep(MAINTENANCE_INTERVAL)
+
+    async def enforce(self, held: Set[str]) -> RetentionReport:
+        now_ms = int(time.time() * 1000)
+        trimmed = 0
+        for table, window_ms in self.policy.windows_ms.items():
+            trimmed += await db.delete_prices_before(table, now_ms - window_ms)
+        footprint = await db.symbol_footprint()
+        candidates = sorted(
+            (f for f in footprint if f.symbol not in held),
+            key=lambda f: f.last_called_ms or 0,
+        )
+        snapshot_rows, _ = await db.table_footprint("snapshots")
+        rows = sum(f.rows for f in footprint) + snapshot_rows
+        # The byte budget covers the whole file, not just the evictable points
+        size, _ = await db.cache_size()
+        evicted = []
+        for f in candidates:
+            expired = now_ms - (f.last_called_ms or 0) > self.policy.unused_ttl_ms
+            over_budget = rows > self.policy.max_rows or size > self.policy.max_bytes
+            if not expired and not over_budget:
+                break
+            evicted.append(f.symbol)
+            rows -= f.rows
+            size -= f.bytes
+        await db.evict_assets(evicted)
+        return RetentionReport(trimmed, evicted)
+
+    async def vacuum(self):
+        while await db.incremental_vacuum(VACUUM_STEP_PAGES):
+            await asyncio.sleep(VACUUM_PAUSE)
+
+    async def stats(self) -> List[SymbolFootprint]:
+        return sorted(await db.symbol_footprint(), key=lambda f: -f.bytes)
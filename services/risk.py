@@ -0,0 +1,148 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import db
+from data_types import RiskStat, PriceSeries
+from wallet import Wallet
+
+MS_PER_DAY = 1000 * 60 * 60 * 24
+DAYS_PER_YEAR = 365
+CACHE_SIZE = 16
+
+
+def align_histories(
+    histories: Dict[str, PriceSeries], symbols: List[str], step_ms: int = MS_PER_DAY
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Put series on one shared timeline of step_ms buckets (UTC days by default).
+
+    Returns the timeline (bucket start in ms) and a buckets x symbols price
+    matrix. Buckets where an asset has no point are forward filled; buckets
+    before its first point stay NaN.
+    """
+    series = [histories.get(s) or PriceSeries.empty() for s in symbols]
+    lengths = np.array([len(h) for h in series], dtype=np.int64)
+    if not lengths.sum():
+        return np.empty(0, dtype=np.int64), np.empty((0, len(symbols)))
+    columns = np.repeat(np.arange(len(symbols)), lengths)
+    days = np.concatenate([h.ts for h in series]) // step_ms
+    timeline, day_index = np.unique(days, return_inverse=True)
+    matrix = np.full((len(timeline), len(symbols)), np.nan)
+    # Points come ordered by timestamp, so the last point of a day wins.
+    matrix[day_index, columns] = np.concatenate([h.prices for h in series])
+    filled = np.where(~np.isnan(matrix), np.arange(len(timeline))[:, None], 0)
+    np.maximum.accumulate(filled, axis=0, out=filled)
+    matrix = matrix[filled, np.arange(len(symbols))]
+    return timeline * step_ms, matrix
+
+
+def _max_drawdown(matrix: np.ndarray) -> np.ndarray:
+    peaks = np.fmax.accumulate(matrix, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = 1 - matrix / peaks
+    drawdown = np.where(np.isnan(drawdown), 0.0, drawdown)
+    return drawdown.max(axis=0, initial=0.0)
+
+
+def compute_risk(
+    symbols: List[str],
+    amounts: List[float],
+    histories: Dict[str, PriceSeries],
+    benchmark: Optional[str],
+) -> RiskStat:
+    columns = symbols + ([benchmark] if benchmark else [])
+    timeline, matrix = align_histories(histories, columns)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(matrix), axis=0)
+    mask = ~np.isnan(returns)
+    counts = mask.sum(axis=0)
+    with np.errstate(invalid="ignore"):
+        mean = np.where(counts > 0, np.nansum(returns, axis=0) / counts, 0.0)
+    centered = np.where(mask, returns - mean, 0.0)
+    # Pairwise-complete covariance: each pair is normalised by the number of
+    # days both assets have a return.
+    pairs = mask.T.astype(np.float64) @ mask.astype(np.float64)
+    cov = (centered.T @ centered) / np.maximum(pairs - 1, 1)
+    std = np.sqrt(np.diag(cov))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = np.clip(cov / np.outer(std, std), -1.0, 1.0)
+    corr = np.where(np.isnan(corr), 0.0, corr)
+    np.fill_diagonal(corr, 1.0)
+
+    held = len(symbols)
+    last_prices = matrix[-1, :held] if len(matrix) else np.zeros(held)
+    values = np.nan_to_num(last_prices) * np.asarray(amounts, dtype=np.float64)
+    total = values.sum()
+    weights = values / total if total else np.zeros(held)
+    portfolio_returns = np.where(mask[:, :held], returns[:, :held], 0.0) @ weights
+    portfolio_index = np.exp(np.cumsum(portfolio_returns))[:, None]
+
+    beta = None
+    if benchmark and len(returns):
+        bench_mask = mask[:, held]
+        bench = returns[bench_mask, held]
+        if len(bench) > 1 and bench.var() > 0:
+            port = portfolio_returns[bench_mask]
+            beta = float(np.cov(port, bench)[0, 1] / bench.var(ddof=1))
+
+    scale = np.sqrt(DAYS_PER_YEAR)
+    return RiskStat(
+        symbols=symbols,
+        volatility=(std[:held] * scale).tolist(),
+        max_drawdown=_max_drawdown(matrix[:, :held]).tolist(),
+        correlation=corr[:held, :held].tolist(),
+        portfolio_volatility=float(portfolio_returns.std(ddof=1) * scale)
+        if len(portfolio_returns) > 1
+        else 0.0,
+        portfolio_max_drawdown=float(_max_drawdown(portfolio_index)[0]),
+        beta=beta,
+        benchmark=benchmark,
+        as_of_ms=int(timeline[-1]) if len(timeline) else 0,
+    )
+
+
+class RiskService:
+    """Risk analytics over the cached daily series of a wallet.
+
+    Results are keyed by wallet composition, benchmark and the newest cached
+    price timestamp, so they are recomputed only when one of those changes.
+    The numeric work runs in the default executor to keep the event loop free.
+    """
+
+    def __init__(self):
+        self._cache: OrderedDict[Tuple, RiskStat] = OrderedDict()
+
+    async def risk_for(
+        self, wallet: Wallet, benchmark: Optional[str] = None
+    ) -> Optional[RiskStat]:
+        amounts: Dict[str, float] = {}
+        for asset in wallet.assets():
+            symbol = asset.name.lower()
+            amounts[symbol] = amounts.get(symbol, 0.0) + asset.amount
+        if not amounts:
+            return None
+        symbols = sorted(amounts)
+        benchmark = benchmark.lower() if benchmark else None
+        columns = symbols + ([benchmark] if benchmark else [])
+        latest = await db.latest_price_ts(columns)
+        key = (tuple((s, amounts[s]) for s in symbols), benchmark, latest)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+        histories = await db.prices_history_for(columns)
+        loop = asyncio.get_running_loop()
+        stat = await loop.run_in_executor(
+            None,
+            compute_risk,
+            symbols,
+            [amounts[s] for s in symbols],
+            histories,
+            benchmark,
+        )
+        self._cache[key] = stat
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return stat
@@ -0,0 +1,136 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime, time as dtime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+CRYPTO_GROUP = "crypto"
+# Seconds between refreshes of a group. Crypto trades around the clock and
+# moves fastest; keyless stock quotes lag the market, so polling them often
+# only spends requests.
+CRYPTO_INTERVAL = 30
+STOCK_INTERVAL = 120
+# Refresh intervals are stretched by this factor while the user is away
+IDLE_FACTOR = 5
+IDLE_AFTER = 60 * 5
+
+
+@dataclass(frozen=True)
+class Session:
+    """Regular trading hours of an exchange, Monday to Friday.
+
+    Exchange holidays and lunch breaks are not modelled: on those days the
+    group keeps refreshing at its normal rate, which is merely wasteful.
+    """
+
+    tz: str
+    open: dtime
+    close: dtime
+
+    def is_open(self, now: datetime) -> bool:
+        local = now.astimezone(ZoneInfo(self.tz))
+        return local.weekday() < 5 and self.open <= local.time() < self.close
+
+    def last_close(self, now: datetime) -> datetime:
+        zone = ZoneInfo(self.tz)
+        local = now.astimezone(zone)
+        day = local.date()
+        while True:
+            if day.weekday() < 5:
+                close = datetime.combine(day, self.close, tzinfo=zone)
+                if close <= local:
+                    return close
+            day -= timedelta(days=1)
+
+
+# Yahoo ticker suffix -> exchange session. Plain tickers trade in the US.
+SESSIONS: Dict[str, Session] = {
+    "": Session("America/New_York", dtime(9, 30), dtime(16, 0)),
+    "TO": Session("America/Toronto", dtime(9, 30), dtime(16, 0)),
+    "L": Session("Europe/London", dtime(8, 0), dtime(16, 30)),
+    "DE": Session("Europe/Berlin", dtime(9, 0), dtime(17, 30)),
+    "F": Session("Europe/Berlin", dtime(8, 0), dtime(20, 0)),
+    "PA": Session("Europe/Paris", dtime(9, 0), dtime(17, 30)),
+    "AS": Session("Europe/Amsterdam", dtime(9, 0), dtime(17, 30)),
+    "MI": Session("Europe/Rome", dtime(9, 0), dtime(17, 30)),
+    "SW": Session("Europe/Zurich", dtime(9, 0), dtime(17, 30)),
+    "T": Session("Asia/Tokyo", dtime(9, 0), dtime(15, 30)),
+    "HK": Session("Asia/Hong_Kong", dtime(9, 30), dtime(16, 0)),
+    "AX": Session("Australia/Sydney", dtime(10, 0), dtime(16, 0)),
+}
+
+
+def stock_group(symbol: str) -> str:
+    _, dot, suffix = symbol.upper().rpartition(".")
+    return f"stock:{suffix if dot else ''}"
+
+
+class RefreshScheduler:
+    """Decides which quote groups are due for a refresh.
+
+    Crypto trades around the clock and is one group. Stocks are grouped by
+    exchange and refreshed only while that exchange is open, plus once after
+    the close to pick up the closing price. Stocks with an unknown suffix are
+    refreshed as if their market were always open.
+    """
+
+    def __init__(
+        self,
+        crypto_interval: float = CRYPTO_INTERVAL,
+        stock_interval: float = STOCK_INTERVAL,
+    ):
+        self.crypto_interval = crypto_interval
+        self.stock_interval = stock_interval
+        self._last: Dict[str, float] = {}
+        self.focused = True
+        self.last_activity = time.time()
+
+    def touch(self):
+        self.last_activity = time.time()
+
+    def _idle(self, now: float) -> bool:
+        return not self.focused or now - self.last_activity > IDLE_AFTER
+
+    def _is_due(
+        self, group: str, session: Optional[Session], interval: float, now: float
+    ) -> bool:
+        last = self._last.get(group)
+        if last is None:
+            return True
+        if self._idle(now):
+            interval *= IDLE_FACTOR
+        moment = datetime.fromtimestamp(now, timezone.utc)
+        if session is None or session.is_open(moment):
+            return now - last >= interval
+        return last < session.last_close(moment).timestamp()
+
+    def due(
+        self, crypto: Iterable[str], stocks: Iterable[str], now: float | None = None
+    ) -> Tuple[Set[str], Set[str], List[str]]:
+        """Crypto and stock symbols to refresh now, and the groups they form."""
+        now = time.time() if now is None else now
+        groups: List[str] = []
+        crypto_due: Set[str] = set()
+        crypto = set(crypto)
+        if crypto and self._is_due(CRYPTO_GROUP, None, self.crypto_interval, now):
+            crypto_due = crypto
+            groups.append(CRYPTO_GROUP)
+        by_group: Dict[str, Set[str]] = {}
+        for symbol in stocks:
+            by_group.setdefault(stock_group(symbol), set()).add(symbol)
+        stocks_due: Set[str] = set()
+        for group, symbols in by_group.items():
+            session = SESSIONS.get(group.removeprefix("stock:"))
+            if self._is_due(group, session, self.stock_interval, now):
+                stocks_due |= symbols
+                groups.append(group)
+        return crypto_due, stocks_due, groups
+
+    def groups(self, stocks: Iterable[str]) -> List[str]:
+        """Every group, used when all quotes are refreshed at once."""
+        return [CRYPTO_GROUP, *{stock_group(symbol) for symbol in stocks}]
+
+    def mark_refreshed(self, groups: Iterable[str], now: float | None = None):
+        now = time.time() if now is None else now
+        for group in groups:
+            self._last[group] = now
@@ -0,0 +1,82 @@
+import asyncio
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+@dataclass
+class FlightStats:
+    calls: int = 0
+    executed: int = 0
+    # Callers that joined a call already in flight
+    shared: int = 0
+    # Refresh requests folded into an already scheduled follow-up
+    coalesced: int = 0
+
+    @property
+    def saved(self) -> int:
+        return self.calls - self.executed
+
+    def to_json(self) -> dict:
+        return {**asdict(self), "saved": self.saved}
+
+    def describe(self) -> str:
+        return (
+            f"{self.calls} calls, {self.executed} executed, {self.saved} saved "
+            f"({self.shared} shared, {self.coalesced} coalesced)"
+        )
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution.
+
+    `do` joins whatever is in flight for the key. `refresh` needs a result
+    that started after the request, so while a call is in flight it queues
+    exactly one follow-up that every later requester shares.
+    Runs are shielded: a cancelled caller doesn't cancel the shared call.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._followup: Dict[Hashable, asyncio.Task] = {}
+        self.stats = FlightStats()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats.calls += 1
+        task = self._followup.get(key) or self._inflight.get(key)
+        if task is None:
+            task = self._start(key, fn)
+        else:
+            self.stats.shared += 1
+        return await asyncio.shield(task)
+
+    async def refresh(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats.calls += 1
+        task = self._followup.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+        elif key in self._inflight:
+            task = asyncio.create_task(self._after(key, self._inflight[key], fn))
+            self._followup[key] = task
+        else:
+            task = self._start(key, fn)
+        return await asyncio.shield(task)
+
+    async def _after(
+        self, key: Hashable, current: asyncio.Task, fn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        await asyncio.wait([current])
+        # Requests arriving from now on need a run that starts after them
+        self._followup.pop(key, None)
+        return await self._start(key, fn)
+
+    def _start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        self.stats.executed += 1
+        task = asyncio.create_task(fn())
+        self._inflight[key] = task
+
+        def _done(t: asyncio.Task):
+            if self._inflight.get(key) is t:
+                self._inflight.pop(key)
+
+        task.add_done_callback(_done)
+        return task
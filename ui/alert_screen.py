@@ -0,0 +1,130 @@
+from datetime import datetime
+
+from textual.screen import ModalScreen
+from textual.widgets import DataTable, Input, Label, Footer, Select
+from textual.containers import Vertical
+
+from services.provider import DataProvider
+from data_types import AlertRule, AlertKind, AlertDirection
+
+
+class AlertScreen(ModalScreen):
+    BINDINGS = [
+        ("escape", "cancel", "Cancel"),
+        ("ctrl+s", "save", "Save"),
+    ]
+
+    def __init__(self, target: str):
+        super().__init__()
+        self.target = target
+
+    def compose(self):
+        with Vertical(id="edit-modal"):
+            yield Label(id="error_label")
+            yield Select(
+                id="alert-kind",
+                options=[
+                    ("Price", AlertKind.PRICE.value),
+                    ("24h change %", AlertKind.CHANGE_PCT.value),
+                    ("Portfolio P&L", AlertKind.PL_TOTAL.value),
+                    ("Portfolio value", AlertKind.PORTFOLIO_VALUE.value),
+                ],
+                value=AlertKind.PRICE.value,
+                allow_blank=False,
+            )
+            yield Label("Ticker or portfolio")
+            yield Input(value=self.target, placeholder="Target", id="target")
+            yield Select(
+                id="alert-direction",
+                options=[
+                    ("Above", AlertDirection.ABOVE.value),
+                    ("Below", AlertDirection.BELOW.value),
+                ],
+                value=AlertDirection.ABOVE.value,
+                allow_blank=False,
+            )
+            yield Label("Threshold")
+            yield Input(placeholder="Threshold", id="threshold")
+        yield Footer()
+
+    def on_mount(self):
+        self.query_one("#error_label", Label).visible = False
+
+    def show_error_message(self, message: str):
+        error_label = self.query_one("#error_label", Label)
+        error_label.update(message)
+        error_label.visible = True
+
+    def action_cancel(self):
+        self.dismiss(None)
+
+    def action_save(self):
+        target = self.query_one("#target", Input).value.strip()
+        if not target:
+            self.show_error_message("Non empty target expected")
+            return
+        threshold_input = self.query_one("#threshold", Input)
+        try:
+            threshold = float(threshold_input.value.strip())
+        except ValueError:
+            threshold_input.value = ""
+            self.show_error_message("Float threshold expected")
+            return
+        kind = AlertKind(self.query_one("#alert-kind", Select).value)
+        direction = AlertDirection(self.query_one("#alert-direction", Select).value)
+        self.dismiss(AlertRule(kind, target, direction, threshold))
+
+
+class AlertListScreen(ModalScreen):
+    BINDINGS = [
+        ("escape", "cancel", "Close"),
+        ("d", "delete_alert", "delete alert"),
+    ]
+
+    def __init__(self, provider: DataProvider):
+        super().__init__()
+        self.provider = provider
+
+    def compose(self):
+        with Vertical(id="alerts-modal"):
+            yield Label(id="alerts-summary")
+            yield DataTable(id="alert-rules")
+        yield Footer()
+
+    def on_mount(self):
+        table = self.query_one(DataTable)
+        table.cursor_type = "row"
+        table.add_columns("Kind", "Target", "Direction", "Threshold", "Last fired")
+        self._show()
+
+    def _show(self):
+        table = self.query_one(DataTable)
+        table.clear()
+        rules = self.provider.alert_rules()
+        for rule in rules:
+            fired = "-"
+            if rule.last_fired_ms is not None:
+                moment = datetime.fromtimestamp(rule.last_fired_ms / 1000)
+                fired = moment.strftime("%Y-%m-%d %H:%M")
+            table.add_row(
+                rule.kind.value,
+                rule.target,
+                rule.direction.value,
+                f"{rule.threshold:g}",
+                fired,
+                key=str(rule.id),
+            )
+        summary = f"{len(rules)} alerts" if rules else "No alerts"
+        self.query_one("#alerts-summary", Label).update(summary)
+
+    def action_cancel(self):
+        self.dismiss(None)
+
+    async def action_delete_alert(self):
+        table = self.query_one(DataTable)
+        if not table.row_count:
+            return
+        key = table.coordinate_to_cell_key(table.cursor_coordinate).row_key.value
+        rule = next(r for r in self.provider.alert_rules() if str(r.id) == key)
+        await self.provider.delete_alert(rule)
+        self._show()
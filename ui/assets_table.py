@@ -3,20 +3,34 @@ from textual.widgets import DataTable
 from textual.reactive import reactive
 from textual.binding import Binding
 from textual_plotext import PlotextPlot
-from rich.text import Text
 
-from typing import Tuple, Any, Dict, Callable, Optional, List
+from dataclasses import replace
+from typing import Tuple, Dict, Optional, List, Set
 import logging
 from datetime import datetime
 
 from ui.pl_header import PLHeader
 from ui.edit_screen import EditAmountScreen
 from ui.delete_screen import ConfirmDeleteScreen
+from ui.portfolio_screen import NewPortfolioScreen
+from ui.alert_screen import AlertScreen, AlertListScreen
+from ui.risk_screen import RiskScreen
+from ui.cells import LazyCell
 from ui import helper
 
 
 from services.provider import DataProvider
-from data_types import AssetStat, TotalStat, AssetType, ChartPeriod, Asset
+from data_types import (
+    AssetStat,
+    TotalStat,
+    AssetType,
+    ChartPeriod,
+    Asset,
+    FiredAlert,
+    Indicator,
+    PriceSeries,
+    AGGREGATE_ACCOUNT,
+)
 
 
 class AssetsTable(Widget):
@@ -31,13 +45,35 @@ class AssetsTable(Widget):
         Binding("1", "chart_range_1m", "1M"),
         Binding("2", "chart_range_6m", "6M"),
         Binding("3", "chart_range_1y", "1Y"),
+        Binding("4", "chart_range_1d", "1D"),
+        Binding("5", "chart_range_1w", "1W"),
+        Binding("v", "next_view", "switch view"),
+        Binding("o", "new_portfolio", "new portfolio"),
+        Binding("r", "add_alert", "add alert"),
+        Binding("l", "show_alerts", "alerts"),
+        Binding("k", "show_risk", "risk"),
+        Binding("f", "show_flight_stats", "request stats", show=False),
+        Binding("space", "toggle_compare", "compare"),
+        Binding("x", "clear_compare", "clear compare", show=False),
+        Binding("s", "toggle_indicator('sma')", "SMA", show=False),
+        Binding("m", "toggle_indicator('ema')", "EMA", show=False),
+        Binding("i", "toggle_indicator('rsi')", "RSI", show=False),
+        Binding("b", "toggle_indicator('bollinger')", "Bollinger", show=False),
+        Binding("w", "toggle_indicator('volatility')", "volatility", show=False),
     ]
     stat: reactive[TotalStat] = reactive(None)
     current_sort: Dict[str, bool] = {}
-    current_sort_key: Optional[Callable] = None
+    chart_period: ChartPeriod = ChartPeriod.MONTH
 
     def __init__(self, provider: DataProvider, *args, **kwargs):
         self.provider = provider
+        self.chart_indicators: Set[Indicator] = set()
+        # Row key -> (name, type) of rows selected for the comparison chart
+        self.compare_selection: Dict[str, Tuple[str, AssetType]] = {}
+        # Numeric model behind the table: row key -> stat and its cells.
+        # Cells are only rebuilt when their numbers change.
+        self._stats: Dict[str, AssetStat] = {}
+        self._cells: Dict[str, Tuple[LazyCell, ...]] = {}
         super().__init__(*args, **kwargs)
 
     async def action_add_asset(self):
@@ -49,8 +85,65 @@ class AssetsTable(Widget):
     async def action_delete_asset(self):
         self.run_worker(self._delete_asset_flow(), exclusive=True)
 
+    def action_next_view(self):
+        views = self.provider.views()
+        current = self.provider.current_view()
+        index = views.index(current) if current in views else -1
+        portfolio, account = views[(index + 1) % len(views)]
+        self.stat = self.provider.select_view(portfolio, account)
+        self.query_one(PLHeader).view_name = self._view_label()
+
+    async def action_new_portfolio(self):
+        self.run_worker(self._new_portfolio_flow(), exclusive=True)
+
+    async def _new_portfolio_flow(self):
+        name = await self.app.push_screen_wait(NewPortfolioScreen())
+        if name:
+            await self.provider.add_portfolio(name)
+            self.stat = self.provider.select_view(name)
+            self.query_one(PLHeader).view_name = self._view_label()
+
+    async def action_add_alert(self):
+        self.run_worker(self._add_alert_flow(), exclusive=True)
+
+    async def _add_alert_flow(self):
+        table = self.query_one(DataTable)
+        target = self.asset_under_cursor().name if table.row_count else ""
+        rule = await self.app.push_screen_wait(AlertScreen(target))
+        if rule:
+            await self.provider.add_alert(rule)
+
+    def action_show_alerts(self):
+        self.app.push_screen(AlertListScreen(self.provider))
+
+    def action_show_flight_stats(self):
+        self.notify(self.provider.flight_stats().describe(), title="Requests")
+
+    def action_show_risk(self):
+        self.app.push_screen(RiskScreen(self.provider))
+
+    def _on_alert(self, alert: FiredAlert):
+        self.notify(alert.describe(), title="Alert", severity="warning", timeout=10)
+
+    def _view_label(self) -> str:
+        portfolio, account = self.provider.current_view()
+        if account is None:
+            return portfolio
+        return f"{portfolio}/{account}"
+
+    def _is_editable(self, asset: Asset) -> bool:
+        if asset.account != AGGREGATE_ACCOUNT:
+            return True
+        self.notify(
+            f"{asset.name} is held in several accounts, switch view to edit it",
+            severity="warning",
+        )
+        return False
+
     async def _delete_asset_flow(self):
         asset = self.asset_under_cursor()
+        if not self._is_editable(asset):
+            return
         result = await self.app.push_screen_wait(ConfirmDeleteScreen(asset.name))
         if result:
             await self.provider.delete_asset(asset)
@@ -58,14 +151,19 @@ class AssetsTable(Widget):
 
     async def _edit_asset_flow(self):
         asset = self.asset_under_cursor()
+        if not self._is_editable(asset):
+            return
         result = await self.app.push_screen_wait(EditAmountScreen(asset))
         if result:
             logging.info(f"Returned result {result}")
-            await self.provider.update_asset(result)
+            await self.provider.update_asset(result, asset)
             self.stat = await self.provider.total_stat()
 
     async def _add_asset_flow(self):
         empty = Asset.empty()
+        _, account = self.provider.current_view()
+        if account is not None:
+            empty.account = account
         result = await self.app.push_screen_wait(EditAmountScreen(empty))
         if result:
             await self.provider.add_asset(result)
@@ -76,30 +174,76 @@ class AssetsTable(Widget):
         yield PLHeader()
         yield DataTable()
 
-    def _plain_key(self, value):
-        return value
-
-    def _float_from_text(self, value):
-        return float(value.plain)
+    def _cell_value(self, cell: LazyCell):
+        return cell.value
 
     def asset_under_cursor(self) -> Asset:
+        return replace(self._stats[self._selected_row_key()].asset)
+
+    def _selected_row_key(self) -> str:
         table = self.query_one(DataTable)
-        coordinate = table.cursor_coordinate
-        row_key = table.coordinate_to_cell_key(coordinate).row_key
-        row_values = table.get_row(row_key)
-        result = Asset(
-            AssetType(row_values[0]), row_values[1], row_values[2], row_values[3]
-        )
-        return result
+        return table.coordinate_to_cell_key(table.cursor_coordinate).row_key.value
+
+    async def action_toggle_compare(self):
+        if not self.query_one(DataTable).row_count:
+            return
+        key = self._selected_row_key()
+        if key in self.compare_selection:
+            del self.compare_selection[key]
+        else:
+            asset = self.asset_under_cursor()
+            self.compare_selection[key] = (asset.name, asset.asset_type)
+        self._sync_rows(self._stats)
+        if self.query_one(PlotextPlot).display:
+            await self._show_chart(self.chart_period)
+
+    async def action_clear_compare(self):
+        if not self.compare_selection:
+            return
+        self.compare_selection.clear()
+        self._sync_rows(self._stats)
+        if self.query_one(PlotextPlot).display:
+            await self._show_chart(self.chart_period)
+
+    def _date_format(self) -> Tuple[str, str]:
+        if self.chart_period.intraday:
+            return helper.INTRADAY_DATE_FORMAT
+        return helper.DAILY_DATE_FORMAT
 
-    def draw_chart(self, data: List[Tuple[int, float]], title: str):
+    def _chart_dates(self, data: PriceSeries) -> List[str]:
+        date_format, _ = self._date_format()
+        return [
+            datetime.fromtimestamp(ts / 1000).strftime(date_format)
+            for ts in data.ts.tolist()
+        ]
+
+    def draw_chart(
+        self,
+        data: Optional[PriceSeries],
+        title: str,
+        overlays: Optional[Dict[Indicator, Dict[str, PriceSeries]]] = None,
+    ):
         plot_text = self.query_one(PlotextPlot)
         plt = plot_text.plt
         plt.clear_figure()
+        plt.date_form(self._date_format()[1])
         if data:
-            y = [d[1] for d in data]
-            x = [datetime.fromtimestamp(d[0] / 1000).strftime("%d/%m/%Y") for d in data]
+            y = data.prices.tolist()
+            x = self._chart_dates(data)
             plt.plot(x, y)
+            for indicator, lines in (overlays or {}).items():
+                yside = "left"
+                if indicator in helper.RIGHT_AXIS_INDICATORS:
+                    yside = "right"
+                for name, line in lines.items():
+                    if not line:
+                        continue
+                    plt.plot(
+                        self._chart_dates(line),
+                        line.prices.tolist(),
+                        label=name,
+                        yside=yside,
+                    )
         else:
             plt.plot([], [])
         plt.title(title)
@@ -109,6 +253,26 @@ class AssetsTable(Widget):
         else:
             plot_text.display = True
 
+    def draw_comparison(self, series: Dict[str, PriceSeries], title: str):
+        plot_text = self.query_one(PlotextPlot)
+        plt = plot_text.plt
+        plt.clear_figure()
+        plt.date_form(self._date_format()[1])
+        if series:
+            # Every series is a suffix of the longest one, so dates are
+            # formatted once and sliced per series
+            dates = self._chart_dates(max(series.values(), key=len))
+            for symbol, line in series.items():
+                x = dates[len(dates) - len(line) :]
+                plt.plot(x, line.prices.tolist(), label=symbol.upper())
+        else:
+            plt.plot([], [])
+        plt.title(title)
+        if plot_text.display:
+            plot_text.refresh()
+        else:
+            plot_text.display = True
+
     async def on_mount(self):
         self.query_one(PlotextPlot).display = False
         table = self.query_one(DataTable)
@@ -117,33 +281,64 @@ class AssetsTable(Widget):
         for header, key in helper.COLUMNS:
             table.add_column(header, key=key)
         await self.provider.init()
+        self.provider.alerts.add_sink(self._on_alert)
+        # Render the last persisted snapshot until live quotes arrive
+        self.stat = self.provider.current_stat()
         self.call_later(self.refresh_data)
-        self.set_interval(helper.UPDATE_INTERVAL, self.refresh_data)
+        self.set_interval(helper.SCHEDULER_TICK, self.scheduled_refresh)
 
     def on_data_table_row_highlighted(self, _):
         pass
         # self.query_one(PlotextPlot).display = False
 
     async def action_chart_range_1m(self):
-        asset = self.asset_under_cursor()
-        data = await self.provider.chart_data_for(
-            asset.name, asset.asset_type, ChartPeriod.MONTH
-        )
-        self.draw_chart(data, f"{asset.name} price for 1M")
+        await self._show_chart(ChartPeriod.MONTH)
 
     async def action_chart_range_6m(self):
-        asset = self.asset_under_cursor()
-        data = await self.provider.chart_data_for(
-            asset.name, asset.asset_type, ChartPeriod.HALF_YEAR
-        )
-        self.draw_chart(data, f"{asset.name} price for 6M")
+        await self._show_chart(ChartPeriod.HALF_YEAR)
 
     async def action_chart_range_1y(self):
+        await self._show_chart(ChartPeriod.YEAR)
+
+    async def action_chart_range_1d(self):
+        await self._show_chart(ChartPeriod.DAY)
+
+    async def action_chart_range_1w(self):
+        await self._show_chart(ChartPeriod.WEEK)
+
+    async def action_toggle_indicator(self, name: str):
+        indicator = Indicator(name)
+        if indicator in self.chart_indicators:
+            self.chart_indicators.remove(indicator)
+        else:
+            self.chart_indicators.add(indicator)
+        if self.query_one(PlotextPlot).display:
+            await self._show_chart(self.chart_period)
+
+    async def _show_chart(self, period: ChartPeriod):
+        self.chart_period = period
+        if self.compare_selection:
+            await self._show_comparison(period)
+            return
         asset = self.asset_under_cursor()
-        data = await self.provider.chart_data_for(
-            asset.name, asset.asset_type, ChartPeriod.YEAR
-        )
-        self.draw_chart(data, f"{asset.name} price for 1Y")
+        data = await self.provider.chart_data_for(asset.name, asset.asset_type, period)
+        overlays = None
+        if data and self.chart_indicators:
+            overlays = await self.provider.indicators_for(
+                asset.name,
+                asset.asset_type,
+                self.chart_indicators,
+                int(data.ts[0]),
+                period.intraday,
+            )
+        label = helper.PERIOD_LABELS[period]
+        self.draw_chart(data, f"{asset.name} price for {label}", overlays)
+
+    async def _show_comparison(self, period: ChartPeriod):
+        assets = list(self.compare_selection.values())
+        series = await self.provider.comparison_for(assets, period)
+        label = helper.PERIOD_LABELS[period]
+        self.draw_comparison(series, f"Performance for {label}, rebased to 100")
 
     async def action_show_chart(self):
         plot_text = self.query_one(PlotextPlot)
@@ -157,22 +352,29 @@ class AssetsTable(Widget):
         new_stat = await self.provider.total_stat()
         self.stat = new_stat
 
-    def create_table_row(self, stat: AssetStat) -> Tuple[Any]:
-        pl_today = Text(
-            f"{stat.pl_today:+.2f}", style=helper.color_for_pl(stat.pl_today)
-        )
-        pl_total = Text(
-            f"{stat.pl_total:+.2f}", style=helper.color_for_pl(stat.pl_total)
-        )
+    async def scheduled_refresh(self):
+        new_stat = await self.provider.scheduled_stat()
+        if new_stat:
+            self.stat = new_stat
+        header = self.query_one(PLHeader)
+        # Offline or with sources down the stat stays equal and never re-renders
+        if header.as_of_ms is not None:
+            header.refresh_age()
+
+    def create_table_row(
+        self, stat: AssetStat, selected: bool = False
+    ) -> Tuple[LazyCell, ...]:
+        mark = f"{helper.COMPARE_MARK} " if selected else ""
         return (
-            stat.asset.asset_type.value,
-            stat.asset.name,
-            f"{stat.asset.amount:.4f}",
-            f"{stat.asset.avg_price:.2f}",
-            f"{stat.price:.2f}",
-            stat.value,
-            pl_today,
-            pl_total,
+            LazyCell(stat.asset.asset_type.value),
+            LazyCell(stat.asset.name, prefix=mark),
+            LazyCell(stat.asset.amount, 4),
+            LazyCell(stat.asset.avg_price, 2),
+            LazyCell(stat.price, 2),
+            LazyCell(stat.value, 2),
+            LazyCell(stat.pl_today, 2, signed=True, style=helper.color_for_pl),
+            LazyCell(stat.pl_total, 2, signed=True, style=helper.color_for_pl),
+            LazyCell(stat.asset.account),
         )
 
     def sort_reverse(self, sort_type: str):
@@ -187,22 +389,19 @@ class AssetsTable(Widget):
 
     def action_sort_by_type(self):
         table = self.query_one(DataTable)
-        table.sort("type", reverse=self.sort_reverse("type"))
-        self.current_sort_key = self._plain_key
+        table.sort("type", key=self._cell_value, reverse=self.sort_reverse("type"))
 
     def action_sort_by_name(self):
         table = self.query_one(DataTable)
-        table.sort("name", reverse=self.sort_reverse("name"))
-        self.current_sort_key = self._plain_key
+        table.sort("name", key=self._cell_value, reverse=self.sort_reverse("name"))
 
     def action_sort_by_pl_total(self):
         table = self.query_one(DataTable)
         table.sort(
             "pl_total",
-            key=self._float_from_text,
+            key=self._cell_value,
             reverse=self.sort_reverse("pl_total"),
         )
-        self.current_sort_key = self._float_from_text
 
     def watch_stat(self, stat: TotalStat) -> None:
         if not stat:
@@ -211,12 +410,52 @@ class AssetsTable(Widget):
         header.value = round(stat.total_value, 2)
         header.today_pl = stat.pl_today
         header.total_pl = stat.pl_total
-        table = self.query_one(DataTable)
-        cursor = table.cursor_coordinate
-        table.clear()
-        for r in stat.asset_stats:
-            table.add_row(*self.create_table_row(r), key=r.asset.name.lower())
-        if self.current_sort:
+        header.view_name = self._view_label()
+        header.as_of_ms = stat.as_of_ms
+        rows = {r.asset.name.lower(): r for r in stat.asset_stats}
+        for key in self.compare_selection.keys() - rows.keys():
+            del self.compare_selection[key]
+        if self._sync_rows(rows) and self.current_sort:
             col, reverse = next(iter(self.current_sort.items()))
-            table.sort(col, reverse=reverse, key=self.current_sort_key)
-        table.cursor_coordinate = cursor
+            table = self.query_one(DataTable)
+            table.sort(col, reverse=reverse, key=self._cell_value)
+
+    def _sync_rows(self, rows: Dict[str, AssetStat]) -> bool:
+        """Bring the table in line with rows, touching only changed cells.
+
+        Returns whether any row was added, removed or changed.
+        """
+        table = self.query_one(DataTable)
+        changed = False
+        for key in self._stats.keys() - rows.keys():
+            table.remove_row(key)
+            del self._cells[key]
+            changed = True
+        for key, stat in rows.items():
+            selected = key in self.compare_selection
+            old = self._cells.get(key)
+            if old is None:
+                cells = self.create_table_row(stat, selected)
+                table.add_row(*cells, key=key)
+                self._cells[key] = cells
+                changed = True
+                continue
+            if self._stats[key] == stat and bool(old[1].prefix) == selected:
+                continue
+            cells = []
+            for (_, column), cell, previous in zip(
+                helper.COLUMNS, self.create_table_row(stat, selected), old
+            ):
+                if (cell.value, cell.prefix) == (previous.value, previous.prefix):
+                    # Keep the cell that may already hold formatted text
+                    cells.append(previous)
+                    continue
+                # Only growing a column is cheap; DataTable re-measures the
+                # whole column when asked to fit a narrower cell
+                grows = cell.width > table.columns[column].content_width
+                table.update_cell(key, column, cell, update_width=grows)
+                cells.append(cell)
+            self._cells[key] = tuple(cells)
+            changed = True
+        self._stats = rows
+        return changed
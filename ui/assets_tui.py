@@ -8,7 +8,6 @@ from typing import List, Tuple, Any
 from datetime import datetime
 
 from ui.assets_table import AssetsTable
-from ui.assets_widget import AssetsWidget
 from services.provider import DataProvider
 
 
@@ -29,3 +28,16 @@ class AssetsTui(App):
 
     def on_mount(self):
         pass
+
+    async def on_unmount(self):
+        await self.provider.close()
+
+    def on_app_focus(self):
+        self.provider.scheduler.focused = True
+        self.provider.scheduler.touch()
+
+    def on_app_blur(self):
+        self.provider.scheduler.focused = False
+
+    def on_key(self, _):
+        self.provider.scheduler.touch()
@@ -0,0 +1,68 @@
+import math
+from typing import Any, Callable, Optional
+
+from rich.cells import cell_len
+from rich.console import Console, ConsoleOptions, RenderResult
+from rich.measure import Measurement
+from rich.text import Text
+
+
+class LazyCell:
+    """DataTable cell that keeps its raw value and formats it on first draw.
+
+    DataTable only renders rows inside the viewport, so the Text of a cell
+    is built when its row is first scrolled into view and then reused. The
+    width DataTable needs for column sizing is worked out from the number
+    itself, without formatting it. Sorting uses `value` directly.
+    """
+
+    __slots__ = ("value", "decimals", "signed", "prefix", "style", "_text")
+
+    def __init__(
+        self,
+        value: Any,
+        decimals: Optional[int] = None,
+        signed: bool = False,
+        prefix: str = "",
+        style: Optional[Callable[[Any], str]] = None,
+    ):
+        self.value = value
+        # None for text cells, else the number of decimals shown
+        self.decimals = decimals
+        self.signed = signed
+        self.prefix = prefix
+        self.style = style
+        self._text: Optional[Text] = None
+
+    @property
+    def width(self) -> int:
+        if self.decimals is None:
+            return cell_len(self.prefix) + cell_len(str(self.value))
+        magnitude = round(abs(self.value), self.decimals)
+        digits = int(math.log10(magnitude)) + 1 if magnitude >= 1 else 1
+        sign = 1 if self.signed or self.value < 0 else 0
+        point = self.decimals + 1 if self.decimals else 0
+        return cell_len(self.prefix) + sign + digits + point
+
+    def plain(self) -> str:
+        if self.decimals is None:
+            return f"{self.prefix}{self.value}"
+        sign = "+" if self.signed else ""
+        return f"{self.prefix}{self.value:{sign}.{self.decimals}f}"
+
+    def text(self) -> Text:
+        if self._text is None:
+            style = self.style(self.value) if self.style else ""
+            self._text = Text(self.plain(), style=style, no_wrap=True)
+        return self._text
+
+    # Not __rich__: Rich casts through it even when only measuring
+    def __rich_console__(
+        self, console: Console, options: ConsoleOptions
+    ) -> RenderResult:
+        yield self.text()
+
+    def __rich_measure__(
+        self, console: Console, options: ConsoleOptions
+    ) -> Measurement:
+        return Measurement(self.width, self.width)
@@ -3,7 +3,7 @@ from textual.screen import ModalScreen
 from textual.widgets import Input, Label, Footer, Select
 from textual.containers import Vertical
 
-from data_types import AssetType, Asset
+from data_types import AssetType, Asset, DEFAULT_ACCOUNT
 
 from typing import Tuple
 
@@ -40,6 +40,8 @@ class EditAmountScreen(ModalScreen):
             yield Input(
                 value=str(self.asset.avg_price), placeholder="Price", id="price"
             )
+            yield Label("Account")
+            yield Input(value=self.asset.account, placeholder="Account", id="account")
         yield Footer()
 
     def on_mount(self):
@@ -91,7 +93,9 @@ class EditAmountScreen(ModalScreen):
             name_input.value = ""
             self.show_error_message(name_error)
             return
+        account_input = self.query_one("#account", Input)
+        account = account_input.value.strip() or DEFAULT_ACCOUNT
         asset_type_input = self.query_one("#asset-type", Select)
         asset_type = AssetType(asset_type_input.value)
-        result = Asset(asset_type, name, amount, price)
+        result = Asset(asset_type, name, amount, price, account)
         self.dismiss(result)
@@ -1,3 +1,7 @@
+import time
+
+from data_types import ChartPeriod, Indicator
+
 RED = "#ff6960"
 GREEN = "#00cc46"
 COLUMNS = [
@@ -9,8 +13,36 @@ COLUMNS = [
     ("Value", "value"),
     ("P&L today", "pl_today"),
     ("[P]&L total", "pl_total"),
+    ("Account", "account"),
 ]
-UPDATE_INTERVAL = 60
+# How often the refresh scheduler is asked whether any market group is due
+SCHEDULER_TICK = 5
+DEFAULT_BENCHMARK = "SPY"
+PERIOD_LABELS = {
+    ChartPeriod.DAY: "1D",
+    ChartPeriod.WEEK: "1W",
+    ChartPeriod.MONTH: "1M",
+    ChartPeriod.HALF_YEAR: "6M",
+    ChartPeriod.YEAR: "1Y",
+}
+# Shown before the name of assets selected for the comparison chart
+COMPARE_MARK = "●"
+# (strftime, plotext date_form) of chart x labels
+DAILY_DATE_FORMAT = ("%d/%m/%Y", "d/m/Y")
+INTRADAY_DATE_FORMAT = ("%d/%m/%Y %H:%M", "d/m/Y H:M")
+# Indicators with their own scale, drawn against the right-hand axis
+RIGHT_AXIS_INDICATORS = (Indicator.RSI, Indicator.VOLATILITY)
+
+
+def format_age(ts_ms: int | None) -> str:
+    if ts_ms is None:
+        return ""
+    minutes = max(0, int(time.time() - ts_ms / 1000) // 60)
+    if minutes < 60:
+        return f"{minutes}m"
+    if minutes < 60 * 24:
+        return f"{minutes // 60}h"
+    return f"{minutes // (60 * 24)}d"
 
 
 def color_for_pl(value: float) -> str:
@@ -20,14 +20,21 @@ class PLHeader(Widget):
     value: reactive[float] = reactive(0.0)
     today_pl: reactive[float] = reactive(0.0)
     total_pl: reactive[float] = reactive(0.0)
+    view_name: reactive[str] = reactive("")
+    # Time of the snapshot on screen, None while the numbers are live
+    as_of_ms: reactive[int | None] = reactive(None)
 
     def _create_header_text(self, value: float, total: float, today: float) -> Text:
-        text = Text(f"Value {value} ; Total P&L ")
+        text = Text(f"[{self.view_name}] ") if self.view_name else Text()
+        text.append(Text(f"Value {value} ; Total P&L "))
         pl_total = Text(f"{round(total, 2)}", style=helper.color_for_pl(total))
         text.append(pl_total)
         text.append(Text(" ; Today P&L "))
         pl_today = Text(f"{round(today)}", style=helper.color_for_pl(today))
         text.append(pl_today)
+        age = helper.format_age(self.as_of_ms)
+        if age:
+            text.append(Text(f" ; snapshot {age} old", style="italic"))
         return text
 
     def compose(self) -> ComposeResult:
@@ -48,3 +55,17 @@ class PLHeader(Widget):
         text = self._create_header_text(v, self.total_pl, self.today_pl)
         label = self.query_one(Label)
         label.update(text)
+
+    def watch_view_name(self, _: str):
+        text = self._create_header_text(self.value, self.total_pl, self.today_pl)
+        label = self.query_one(Label)
+        label.update(text)
+
+    def watch_as_of_ms(self, _: int | None):
+        self.refresh_age()
+
+    def refresh_age(self):
+        """Redraw with the current snapshot age, which grows with no new stat."""
+        text = self._create_header_text(self.value, self.total_pl, self.today_pl)
+        label = self.query_one(Label)
+        label.update(text)
@@ -0,0 +1,23 @@
+from textual.screen import ModalScreen
+from textual.widgets import Label, Input, Footer
+from textual.containers import Vertical
+
+
+class NewPortfolioScreen(ModalScreen):
+    BINDINGS = [
+        ("escape", "cancel", "Cancel"),
+        ("ctrl+s", "save", "Save"),
+    ]
+
+    def compose(self):
+        with Vertical(id="edit-modal"):
+            yield Label("Portfolio name")
+            yield Input(placeholder="Portfolio name", id="portfolio_name")
+        yield Footer()
+
+    def action_save(self):
+        name = self.query_one("#portfolio_name", Input).value.strip()
+        self.dismiss(name or None)
+
+    def action_cancel(self):
+        self.dismiss(None)
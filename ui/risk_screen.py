@@ -0,0 +1,67 @@
+from textual.screen import ModalScreen
+from textual.widgets import DataTable, Input, Label, Footer
+from textual.containers import Vertical
+
+from services.provider import DataProvider
+from data_types import RiskStat
+from ui import helper
+
+
+class RiskScreen(ModalScreen):
+    BINDINGS = [
+        ("escape", "cancel", "Close"),
+    ]
+
+    def __init__(self, provider: DataProvider):
+        super().__init__()
+        self.provider = provider
+
+    def compose(self):
+        with Vertical(id="risk-modal"):
+            yield Label("Benchmark")
+            yield Input(value=helper.DEFAULT_BENCHMARK, id="benchmark")
+            yield Label("Calculating...", id="risk-summary")
+            yield DataTable(id="risk-assets")
+            yield DataTable(id="risk-correlation")
+        yield Footer()
+
+    def on_mount(self):
+        assets = self.query_one("#risk-assets", DataTable)
+        assets.add_columns("Name", "Volatility", "Max drawdown")
+        self.run_worker(self._load(), exclusive=True)
+
+    def on_input_submitted(self, _: Input.Submitted):
+        self.run_worker(self._load(), exclusive=True)
+
+    async def _load(self):
+        benchmark = self.query_one("#benchmark", Input).value.strip() or None
+        stat = await self.provider.risk_stat(benchmark)
+        self._show(stat)
+
+    def _show(self, stat: RiskStat | None):
+        summary = self.query_one("#risk-summary", Label)
+        assets = self.query_one("#risk-assets", DataTable)
+        correlation = self.query_one("#risk-correlation", DataTable)
+        assets.clear()
+        correlation.clear(columns=True)
+        if stat is None:
+            summary.update("No holdings")
+            return
+        beta = "n/a" if stat.beta is None else f"{stat.beta:.2f}"
+        summary.update(
+            f"Volatility {stat.portfolio_volatility:.2%} ; "
+            f"Max drawdown {stat.portfolio_max_drawdown:.2%} ; "
+            f"Beta vs {(stat.benchmark or '-').upper()} {beta}"
+        )
+        for symbol, vol, drawdown in zip(
+            stat.symbols, stat.volatility, stat.max_drawdown
+        ):
+            assets.add_row(symbol.upper(), f"{vol:.2%}", f"{drawdown:.2%}")
+        correlation.add_column("")
+        for symbol in stat.symbols:
+            correlation.add_column(symbol.upper())
+        for symbol, row in zip(stat.symbols, stat.correlation):
+            correlation.add_row(symbol.upper(), *(f"{v:+.2f}" for v in row))
+
+    def action_cancel(self):
+        self.dismiss(None)
@@ -1,8 +1,25 @@
-from dataclasses import dataclass
-from typing import List, Dict, Any
-from data_types import Asset, AssetType
+from dataclasses import dataclass, replace
+from typing import List, Dict, Any, Set, Tuple, IO, Optional
+from data_types import Asset, AssetType, AGGREGATE_ACCOUNT, DEFAULT_PORTFOLIO
 from pathlib import Path
+import asyncio
 import json
+import logging
+import os
+
+# Journal records written before the journal is folded into a new snapshot
+COMPACT_EVERY = 500
+
+
+def _atomic_write_json(path: Path, data: Any) -> None:
+    """Replace path with data so readers see either the old or the new file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
 
 
 @dataclass
@@ -21,6 +38,14 @@ class Wallet:
                 stocks[asset.name] = asset
         return Wallet(crypto=crypto, stocks=stocks)
 
+    def holdings(self, asset_type: AssetType) -> Dict[str, Asset]:
+        if asset_type == AssetType.CRYPTO:
+            return self.crypto
+        return self.stocks
+
+    def assets(self) -> List[Asset]:
+        return [*self.crypto.values(), *self.stocks.values()]
+
     def to_json(self):
         return {
             "crypto": [val.to_json() for val in self.crypto.values()],
@@ -44,9 +69,7 @@ class Wallet:
         )
 
     def save(self, path: Path) -> None:
-        path.parent.mkdir(parents=True, exist_ok=True)
-        print(self.to_json())
-        path.write_text(json.dumps(self.to_json(), indent=2))
+        _atomic_write_json(path, self.to_json())
 
     @staticmethod
     def load(path: Path) -> "Wallet":
@@ -54,3 +77,197 @@ class Wallet:
             return Wallet({}, {})
         data = json.loads(path.read_text())
         return Wallet.from_json(data)
+
+
+@dataclass
+class Portfolio:
+    name: str
+    accounts: Dict[str, Wallet]
+
+    @staticmethod
+    def from_asset_list(name: str, lst: List[Asset]) -> "Portfolio":
+        by_account: Dict[str, List[Asset]] = {}
+        for asset in lst:
+            by_account.setdefault(asset.account, []).append(asset)
+        accounts = {
+            account: Wallet.from_asset_list(assets)
+            for account, assets in by_account.items()
+        }
+        return Portfolio(name, accounts)
+
+    def account(self, account: str) -> Wallet:
+        if account not in self.accounts:
+            self.accounts[account] = Wallet({}, {})
+        return self.accounts[account]
+
+    def symbols(self) -> Tuple[Set[str], Set[str]]:
+        crypto: Set[str] = set()
+        stocks: Set[str] = set()
+        for wallet in self.accounts.values():
+            crypto.update(wallet.crypto.keys())
+            stocks.update(wallet.stocks.keys())
+        return crypto, stocks
+
+    def aggregate(self) -> Wallet:
+        """Sum holdings of the same ticker across all accounts.
+
+        Amounts are added up and the average price is weighted by amount. A
+        merged asset keeps its account name only when a single account holds
+        it, otherwise it is marked with AGGREGATE_ACCOUNT.
+        """
+        merged = Wallet({}, {})
+        for wallet in self.accounts.values():
+            for asset in wallet.assets():
+                holdings = merged.holdings(asset.asset_type)
+                existing = holdings.get(asset.name)
+                if existing is None:
+                    holdings[asset.name] = replace(asset)
+                    continue
+                amount = existing.amount + asset.amount
+                if amount:
+                    existing.avg_price = (
+                        existing.avg_price * existing.amount
+                        + asset.avg_price * asset.amount
+                    ) / amount
+                existing.amount = amount
+                existing.account = AGGREGATE_ACCOUNT
+        return merged
+
+
+class WalletJournal:
+    """File wallet store: compacted JSON snapshot plus append-only journal.
+
+    Every mutation is one fsynced journal line, so a write costs O(change)
+    instead of rewriting the wallet. Each COMPACT_EVERY records the state is
+    written to a new snapshot via temp file and rename, then the journal is
+    truncated. Records carry a sequence number and the snapshot stores the
+    last one it includes, so a crash between the rename and the truncation
+    can't apply a record twice. A torn last line from a crash mid-append is
+    ignored on recovery. Writes run in a worker thread, one at a time and in
+    order, so an fsync never blocks the event loop.
+
+    Exposes the same coroutines as the wallet functions in db, so
+    PortfolioService can use either as its store.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.journal_path = path.with_name(path.name + ".journal")
+        # portfolio -> (account, name) -> asset, same key as the wallet table
+        self._portfolios: Dict[str, Dict[Tuple[str, str], Asset]] = {}
+        self._seq = 0
+        self._pending = 0
+        self._journal: Optional[IO[str]] = None
+        self._lock = asyncio.Lock()
+        self._recover()
+
+    def _recover(self):
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+            self._seq = data["seq"]
+            for name, assets in data["portfolios"].items():
+                self._portfolios[name] = {}
+                for item in assets:
+                    asset = Asset.from_json(item)
+                    self._portfolios[name][(asset.account, asset.name)] = asset
+        if self.journal_path.exists():
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        logging.error("Wallet journal ends with a torn record")
+                        break
+                    if record["seq"] > self._seq:
+                        self._apply(record)
+                        self._seq = record["seq"]
+                        self._pending += 1
+        self._portfolios.setdefault(DEFAULT_PORTFOLIO, {})
+        # Also drops a torn tail, which new records must not be appended to
+        if self.journal_path.exists() and self.journal_path.stat().st_size:
+            self.compact()
+
+    def _apply(self, record: dict):
+        holdings = self._portfolios.setdefault(record["portfolio"], {})
+        if record["op"] == "portfolio":
+            return
+        asset = Asset.from_json(record["asset"])
+        key = (asset.account, asset.name)
+        if record["op"] == "add":
+            holdings[key] = asset
+        elif record["op"] == "update":
+            if key in holdings:
+                holdings[key] = replace(
+                    holdings[key], amount=asset.amount, avg_price=asset.avg_price
+                )
+        elif record["op"] == "delete":
+            holdings.pop(key, None)
+
+    async def _append(self, op: str, portfolio: str, asset: Optional[Asset] = None):
+        async with self._lock:
+            record = {"seq": self._seq + 1, "op": op, "portfolio": portfolio}
+            if asset is not None:
+                record["asset"] = asset.to_json()
+            line = json.dumps(record, separators=(",", ":")) + "\n"
+            await asyncio.to_thread(self._write, line)
+            self._apply(record)
+            self._seq = record["seq"]
+            self._pending += 1
+            # Holding the lock keeps the state still while the thread reads it
+            if self._pending >= COMPACT_EVERY:
+                await asyncio.to_thread(self.compact)
+
+    def _write(self, line: str):
+        if self._journal is None:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal.write(line)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def compact(self):
+        """Write the full state as a new snapshot and start an empty journal."""
+        _atomic_write_json(
+            self.path,
+            {
+                "seq": self._seq,
+                "portfolios": {
+                    name: [asset.to_json() for asset in holdings.values()]
+                    for name, holdings in self._portfolios.items()
+                },
+            },
+        )
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, "w", encoding="utf-8")
+        self._pending = 0
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    async def portfolio_names(self) -> List[str]:
+        return list(self._portfolios)
+
+    async def wallet_assets(self, portfolio: str = DEFAULT_PORTFOLIO) -> List[Asset]:
+        return [replace(a) for a in self._portfolios.get(portfolio, {}).values()]
+
+    async def add_portfolio(self, portfolio: str):
+        if portfolio not in self._portfolios:
+            await self._append("portfolio", portfolio)
+
+    async def add_asset_to_wallet(
+        self, asset: Asset, portfolio: str = DEFAULT_PORTFOLIO
+    ):
+        await self._append("add", portfolio, asset)
+
+    async def update_asset_in_wallet(
+        self, asset: Asset, portfolio: str = DEFAULT_PORTFOLIO
+    ):
+        await self._append("update", portfolio, asset)
+
+    async def delete_asset_from_wallet(
+        self, asset: Asset, portfolio: str = DEFAULT_PORTFOLIO
+    ):
+        await self._append("delete", portfolio, asset)